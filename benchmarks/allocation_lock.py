@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+Measure how long the allocation lock is held by find_machine + take_machine and by release_machine,
+with the hub's usual info-level logging and with verbose (debug-level) logging.
+
+Host probes are replaced by an always-online stub, so only the bookkeeping and logging work is measured.
+
+Usage: python benchmarks/allocation_lock.py [--hosts 20] [--sessions 2000] [--iterations 2000]
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+from threading import Lock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mlhubspawner.machine_manager import MachineManager
+from mlhubspawner.remote_hosts.remote_ml_host import RemoteMLHost
+
+class OnlineMachineManager(MachineManager):
+    def is_machine_online(self, hostname_ip: str) -> bool:
+        return True
+
+def make_logger(level: int) -> logging.Logger:
+    logger = logging.getLogger(f"allocation_lock_benchmark_{logging.getLevelName(level)}")
+    logger.setLevel(level)
+    logger.propagate = False
+    # Format every record for real, like a hub logging to a file would
+    handler = logging.StreamHandler(open(os.devnull, "w"))
+    handler.setFormatter(logging.Formatter("[%(levelname)s %(asctime)s %(name)s] %(message)s"))
+    logger.addHandler(handler)
+    return logger
+
+def run(level: int, hosts: int, sessions: int, iterations: int):
+    machine_type = RemoteMLHost(codename="bench", hostnames=[f"10.0.0.{index}:22" for index in range(hosts)], shared_access_enabled=True)
+    machine_manager = OnlineMachineManager(make_logger(level), [machine_type])
+    lock = Lock()
+
+    # Background sessions, spread evenly over the hosts
+    for index in range(sessions):
+        machine_manager.take_machine(machine_type, machine_type.hostnames[index % hosts], f"background-{index}", True)
+
+    take_times = []
+    release_times = []
+    for index in range(iterations):
+        unique_identifier = f"user-{index}"
+        with lock:
+            start = time.perf_counter()
+            hostname = machine_manager.find_machine(machine_type, True, unique_identifier)
+            machine_manager.take_machine(machine_type, hostname, unique_identifier, True)
+            take_times.append(time.perf_counter() - start)
+        with lock:
+            start = time.perf_counter()
+            machine_manager.release_machine(unique_identifier)
+            release_times.append(time.perf_counter() - start)
+    return take_times, release_times
+
+def describe(name: str, samples):
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"  {name:<8} mean {statistics.mean(samples) * 1e6:8.1f} us   median {statistics.median(samples) * 1e6:8.1f} us   p99 {p99 * 1e6:8.1f} us")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hosts", type=int, default=20)
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{args.hosts} hosts, {args.sessions} background sessions, {args.iterations} iterations")
+    for level in (logging.INFO, logging.DEBUG):
+        take_times, release_times = run(level, args.hosts, args.sessions, args.iterations)
+        print(f"Lock hold time with {logging.getLevelName(level)} logging{' (verbose)' if level == logging.DEBUG else ''}:")
+        describe("take", take_times)
+        describe("release", release_times)
+
+if __name__ == "__main__":
+    main()
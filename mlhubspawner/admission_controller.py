@@ -0,0 +1,113 @@
+from typing import AbstractSet, Dict, Optional
+from .token_bucket import TokenBucket
+
+class AdmissionController:
+    def __init__(self, upstream_logger, user_rate_per_minute: float, user_burst: int, type_rate_per_minute: float, type_burst: int, max_launches_per_host: int):
+        """
+        Decide, before any probe, lock or SSH work is done, whether a spawn request may proceed.
+
+        - Each user may start spawns at user_rate_per_minute, with bursts of up to user_burst.
+        - Each machine type may receive spawns at type_rate_per_minute, with bursts of up to type_burst.
+        - Each host may have at most max_launches_per_host notebook launches in flight at once. Placement skips
+          the hosts that are at the limit (see saturated_hosts), so it never reserves a spot it cannot launch on.
+        A rate or maximum of 0 disables the corresponding limit.
+
+        Every decision is counted, see stats(). Nothing here ever blocks.
+        Note: This is only used from the event loop, hence no locking.
+        """
+        self.upstream_logger = upstream_logger
+        self.user_rate = user_rate_per_minute / 60.0
+        self.user_burst = user_burst
+        self.type_rate = type_rate_per_minute / 60.0
+        self.type_burst = type_burst
+        self.max_launches_per_host = max_launches_per_host
+        # Maps unique_identifier -> TokenBucket
+        self.user_buckets: Dict[str, TokenBucket] = {}
+        # Maps codename -> TokenBucket
+        self.type_buckets: Dict[str, TokenBucket] = {}
+        # Maps hostname -> number of launches in flight
+        self.launches_in_flight: Dict[str, int] = {}
+        self.counters: Dict[str, int] = {
+            "admitted": 0,
+            "rejected_user_rate": 0,
+            "rejected_type_rate": 0,
+            "rejected_host_launches": 0
+        }
+
+    def _bucket(self, buckets: Dict[str, TokenBucket], key: str, rate: float, burst: int) -> TokenBucket:
+        bucket = buckets.get(key)
+        if bucket is None:
+            # Full buckets carry no information, so drop them before adding a new one; this bounds the per-user state
+            if len(buckets) >= 1024:
+                for stale_key in [stale_key for stale_key, stale_bucket in buckets.items() if stale_bucket.is_full()]:
+                    del buckets[stale_key]
+            bucket = TokenBucket(rate, burst)
+            buckets[key] = bucket
+        return bucket
+
+    def admit(self, unique_identifier: str, codename: str) -> Optional[str]:
+        """
+        Check the per-user and per-machine-type rate limits for a new spawn request.
+        Returns None if the request is admitted, or the reason for the rejection, to be shown to the user.
+        """
+        user_bucket = None
+        if self.user_rate > 0:
+            user_bucket = self._bucket(self.user_buckets, unique_identifier, self.user_rate, self.user_burst)
+            if not user_bucket.try_take():
+                self.counters["rejected_user_rate"] += 1
+                self.upstream_logger.info(f"[AdmissionController] Rejected spawn of {unique_identifier} ({codename}): user rate limit.")
+                return "You are starting servers too often. Please wait a minute before trying again."
+
+        if self.type_rate > 0:
+            type_bucket = self._bucket(self.type_buckets, codename, self.type_rate, self.type_burst)
+            if not type_bucket.try_take():
+                # The user did not get to spawn, so this attempt should not count against them
+                if user_bucket is not None:
+                    user_bucket.give_back()
+                self.counters["rejected_type_rate"] += 1
+                self.upstream_logger.info(f"[AdmissionController] Rejected spawn of {unique_identifier} ({codename}): machine type rate limit.")
+                return "Too many servers are being started on this machine type right now. Please try again in a minute."
+
+        self.counters["admitted"] += 1
+        return None
+
+    def saturated_hosts(self) -> AbstractSet[str]:
+        """
+        Return the hostnames with max_launches_per_host launches in flight, which placement must skip.
+        """
+        if self.max_launches_per_host <= 0:
+            return frozenset()
+        return frozenset(hostname for hostname, in_flight in self.launches_in_flight.items() if in_flight >= self.max_launches_per_host)
+
+    def reject_host_launches(self, unique_identifier: str, codename: str) -> str:
+        """
+        Count a spawn that found no host because the eligible ones were all at their launch limit.
+        Returns the reason for the rejection, to be shown to the user.
+        """
+        self.counters["rejected_host_launches"] += 1
+        self.upstream_logger.info(f"[AdmissionController] Rejected spawn of {unique_identifier} ({codename}): host launch limit.")
+        return "Too many servers are being started on this machine type right now. Please try again in a minute."
+
+    def acquire_launch(self, hostname: str):
+        """
+        Take one of the host's launch slots. Call it under the allocation lock, for a host placement returned
+        while skipping saturated_hosts(), so that the slot is always available.
+        Every acquire must be followed by a release_launch.
+        """
+        self.launches_in_flight[hostname] = self.launches_in_flight.get(hostname, 0) + 1
+
+    def release_launch(self, hostname: str):
+        in_flight = self.launches_in_flight.get(hostname, 0) - 1
+        if in_flight > 0:
+            self.launches_in_flight[hostname] = in_flight
+        else:
+            self.launches_in_flight.pop(hostname, None)
+
+    def stats(self) -> Dict:
+        """
+        Return the decision counters since startup, and the launches currently in flight per host.
+        """
+        return {
+            "counters": dict(self.counters),
+            "launches_in_flight": dict(self.launches_in_flight)
+        }
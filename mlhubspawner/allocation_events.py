@@ -0,0 +1,46 @@
+import logging
+import random
+
+class _EventFields:
+    """
+    The key=value part of an allocation event. Only turned into a string if a handler actually formats the record.
+    """
+    __slots__ = ("fields",)
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def __str__(self):
+        return " ".join(f"{key}={value}" for key, value in self.fields.items())
+
+class AllocationEventLogger:
+    def __init__(self, upstream_logger, sample_rate: float = 1.0):
+        """
+        Emit allocation events as single "[MachineManager] <event> key=value ..." lines.
+
+        Events whose level is disabled cost a single isEnabledFor check, and the fields are only formatted if the
+        record is emitted. High-volume events (one per candidate host) go through emit_sampled, which only keeps
+        a sample_rate fraction of them.
+        """
+        self.upstream_logger = upstream_logger
+        self.sample_rate = sample_rate
+
+    def emit(self, level: int, event: str, **fields):
+        if not self.upstream_logger.isEnabledFor(level):
+            return
+        self.upstream_logger.log(level, "[MachineManager] %s %s", event, _EventFields(fields))
+
+    def emit_sampled(self, level: int, event: str, **fields):
+        if not self.upstream_logger.isEnabledFor(level):
+            return
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        self.upstream_logger.log(level, "[MachineManager] %s %s", event, _EventFields(fields))
+
+    def emit_debug_dump(self, hostname: str, uids):
+        """
+        Emit the full list of UIDs on a host. O(sessions on the host), hence only at debug level.
+        """
+        if not self.upstream_logger.isEnabledFor(logging.DEBUG):
+            return
+        self.upstream_logger.debug("[MachineManager] host_allocations host=%s uids=%s", hostname, ",".join(str(uid) for uid in uids))
@@ -0,0 +1,130 @@
+import json
+from tornado import web
+from jupyterhub.apihandlers.base import APIHandler
+from jupyterhub.scopes import needs_scope
+from .mlhubspawner import MLHubSpawner
+from .fleet_config import parse_host_catalog
+
+# Admin-only hub API endpoints. Register them in jupyterhub_config.py through c.JupyterHub.extra_handlers, e.g.:
+#   c.JupyterHub.extra_handlers = [(r"/api/mlhub/utilization", UtilizationAPIHandler)]
+# The README lists every handler along with its suggested path.
+
+def _get_machine_manager():
+    # The MachineManager only exists once the first spawner has been created
+    machine_manager = MLHubSpawner._machine_manager
+    if machine_manager is None:
+        raise web.HTTPError(503, "No spawner has been created yet.")
+    return machine_manager
+
+class UtilizationAPIHandler(APIHandler):
+    """
+    Serve the aggregated occupancy history of every host and machine type.
+    Query arguments: window (seconds, default 3600) and step (seconds per bucket, default 300).
+    """
+    @needs_scope("admin:servers")
+    async def get(self):
+        try:
+            window = int(self.get_argument("window", "3600"))
+            step = int(self.get_argument("step", "300"))
+        except ValueError:
+            raise web.HTTPError(400, "window and step must be integers.")
+        if window <= 0 or step <= 0:
+            raise web.HTTPError(400, "window and step must be positive.")
+
+        self.write(json.dumps(_get_machine_manager().occupancy.utilization(window, step)))
+
+class IdleReportAPIHandler(APIHandler):
+    """
+    Serve the report of the most recent idle check: the idle exclusive allocations, and how many hosts per
+    machine type their policies would recover. With ?refresh=1, a fresh dry-run check is made first.
+    """
+    @needs_scope("admin:servers")
+    async def get(self):
+        idle_reclaimer = MLHubSpawner._idle_reclaimer
+        if idle_reclaimer is None:
+            raise web.HTTPError(503, "No spawner has been created yet.")
+
+        if self.get_argument("refresh", "0") == "1":
+            report = await idle_reclaimer.check_once(dry_run=True)
+        else:
+            report = idle_reclaimer.last_report
+        self.write(json.dumps(report))
+
+class FleetReloadAPIHandler(APIHandler):
+    """
+    Apply a new host catalog without restarting the hub. The request body may hold the catalog as a JSON list of
+    remote_hosts entries; without a body, fleet_config_file is re-read. Responds with the added, removed and
+    draining hostnames.
+    Note that a catalog sent in the body is replaced again by the next change of fleet_config_file, if one is configured.
+    """
+    @needs_scope("admin:servers")
+    async def post(self):
+        machine_manager = _get_machine_manager()
+        try:
+            if self.request.body:
+                remote_hosts = parse_host_catalog(json.loads(self.request.body))
+                with MLHubSpawner._machine_manager_lock:
+                    summary = machine_manager.apply_host_catalog(remote_hosts)
+            elif MLHubSpawner._fleet_config_watcher is not None:
+                summary = MLHubSpawner._fleet_config_watcher.reload()
+            else:
+                raise web.HTTPError(400, "No catalog in the request body, and no fleet_config_file configured.")
+        except (ValueError, OSError) as e:
+            raise web.HTTPError(400, f"Unable to apply the host catalog: {e}")
+        self.write(json.dumps(summary))
+
+class AllocationSnapshotAPIHandler(APIHandler):
+    """
+    Serve every current allocation grouped by hostname, along with the hostnames being drained.
+    """
+    @needs_scope("admin:servers")
+    async def get(self):
+        machine_manager = _get_machine_manager()
+        with MLHubSpawner._machine_manager_lock:
+            snapshot = {
+                "allocations": machine_manager.snapshot_allocations(),
+                "draining": sorted(machine_manager.draining_hostnames)
+            }
+        self.write(json.dumps(snapshot))
+
+class AdmissionStatsAPIHandler(APIHandler):
+    """
+    Serve the spawn admission counters (admitted, and rejected per limit) since the hub started,
+    along with the notebook launches currently in progress per host.
+    """
+    @needs_scope("admin:servers")
+    async def get(self):
+        admission_controller = MLHubSpawner._admission_controller
+        if admission_controller is None:
+            raise web.HTTPError(503, "No spawner has been created yet.")
+        self.write(json.dumps(admission_controller.stats()))
+
+class PackageCachePrewarmAPIHandler(APIHandler):
+    """
+    GET serves the report of the most recent shared package cache prewarm. POST starts prewarming every host
+    (or only ?host=<hostname>) in the background, and responds right away; hosts already holding the current
+    package list are left untouched.
+    """
+    def _get_prewarmer(self):
+        prewarmer = MLHubSpawner._package_cache_prewarmer
+        if prewarmer is None:
+            raise web.HTTPError(404, "Shared package cache prewarming is not configured.")
+        return prewarmer
+
+    @needs_scope("admin:servers")
+    async def get(self):
+        prewarmer = self._get_prewarmer()
+        self.write(json.dumps({"running": prewarmer.is_running(), "last_report": prewarmer.last_report}))
+
+    @needs_scope("admin:servers")
+    async def post(self):
+        prewarmer = self._get_prewarmer()
+        machine_manager = _get_machine_manager()
+        host = self.get_argument("host", None)
+        if host is not None and host not in machine_manager.get_hostnames():
+            raise web.HTTPError(400, f"Unknown hostname: {host}")
+        if prewarmer.is_running():
+            raise web.HTTPError(409, "A prewarm is already running.")
+        prewarmer.prewarm_in_background([host] if host is not None else machine_manager.get_hostnames())
+        self.set_status(202)
+        self.write(json.dumps({"running": True}))
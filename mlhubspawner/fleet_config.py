@@ -0,0 +1,90 @@
+import asyncio
+import json
+import os
+from typing import Any, Dict, List, Optional
+from .remote_hosts.remote_ml_host import RemoteMLHost
+
+def parse_host_catalog(entries: List[Dict[str, Any]]) -> List[RemoteMLHost]:
+    """
+    Build the machine types from a list of dictionaries shaped like the entries of MLHubSpawner.remote_hosts.
+    Raises ValueError if the list is malformed, so that a broken catalog is never applied partially.
+    Every hostname must have the "ip:port" format that the rest of the spawner splits it by.
+    """
+    if not isinstance(entries, list):
+        raise ValueError("The host catalog must be a list of machine types.")
+
+    remote_hosts = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            raise ValueError(f"Invalid machine type entry: {entry!r}")
+        try:
+            remote_hosts.append(RemoteMLHost(**entry))
+        except Exception as e:
+            raise ValueError(f"Invalid machine type {entry.get('codename')!r}: {e}")
+
+    for host in remote_hosts:
+        for hostname in host.hostnames:
+            ip, separator, port = hostname.partition(":")
+            if not separator or not ip or not port.isdigit() or not 0 < int(port) < 65536:
+                raise ValueError(f"Invalid hostname {hostname!r} in machine type {host.codename!r}, expected ip:port.")
+
+    codenames = [host.codename for host in remote_hosts]
+    if len(codenames) != len(set(codenames)):
+        raise ValueError("Machine type codenames must be unique.")
+    return remote_hosts
+
+def load_host_catalog(file_path: str) -> List[RemoteMLHost]:
+    """
+    Read the machine types from a JSON file holding a list of remote_hosts entries.
+    """
+    with open(file_path, "r") as file:
+        return parse_host_catalog(json.load(file))
+
+class FleetConfigWatcher:
+    def __init__(self, upstream_logger, machine_manager, machine_manager_lock, file_path: str, poll_interval: int):
+        """
+        Watch the fleet configuration file, and apply it to the MachineManager whenever its modification time changes.
+        """
+        self.upstream_logger = upstream_logger
+        self.machine_manager = machine_manager
+        self.machine_manager_lock = machine_manager_lock
+        self.file_path = file_path
+        self.poll_interval = poll_interval
+        self.last_mtime: Optional[float] = None
+        self._task = None
+
+    def ensure_started(self):
+        """
+        Start watching the file, if not already watching. Must be called from within the running event loop.
+        """
+        if self.poll_interval > 0 and self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                mtime = os.path.getmtime(self.file_path)
+            except OSError as e:
+                self.upstream_logger.info(f"[FleetConfigWatcher] Unable to stat {self.file_path}: {e}")
+                continue
+            if mtime != self.last_mtime:
+                try:
+                    self.reload()
+                except Exception as e:
+                    # Keep the current catalog, and retry on the next change
+                    self.upstream_logger.info(f"[FleetConfigWatcher] Not applying {self.file_path}: {e}")
+                    self.last_mtime = mtime
+
+    def reload(self) -> Dict[str, List[str]]:
+        """
+        Read the file and apply it right away. Raises if the file cannot be read or is malformed.
+        """
+        mtime = os.path.getmtime(self.file_path)
+        remote_hosts = load_host_catalog(self.file_path)
+        self.last_mtime = mtime
+        return self.apply(remote_hosts)
+
+    def apply(self, remote_hosts: List[RemoteMLHost]) -> Dict[str, List[str]]:
+        with self.machine_manager_lock:
+            return self.machine_manager.apply_host_catalog(remote_hosts)
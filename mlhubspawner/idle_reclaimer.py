@@ -0,0 +1,163 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+class IdleReclaimer:
+    def __init__(self, upstream_logger, machine_manager, machine_manager_lock, check_interval: int, dry_run: bool, sample_seconds: int = 2):
+        """
+        Periodically look for idle exclusive allocations and apply the idle policy of their machine type
+        (see RemoteGenericHost.idle_timeout and idle_action).
+
+        An exclusive allocation is idle when JupyterHub has seen no activity from the user for idle_timeout seconds,
+        and the user's CPU usage and the host's GPU utilization, sampled over SSH, are both below the type's thresholds.
+
+        In dry-run mode no action is taken; every check only produces a report of what would have been reclaimed.
+        """
+        self.upstream_logger = upstream_logger
+        self.machine_manager = machine_manager
+        self.machine_manager_lock = machine_manager_lock
+        self.check_interval = check_interval
+        self.dry_run = dry_run
+        self.sample_seconds = sample_seconds
+        # Maps unique_identifier -> spawner of a running notebook
+        self.spawners: Dict[str, Any] = {}
+        # Unique identifiers already warned about during their current idle period
+        self.warned = set()
+        # Report of the most recent check
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._task = None
+
+    def register(self, unique_identifier: str, spawner):
+        self.spawners[unique_identifier] = spawner
+
+    def unregister(self, unique_identifier: str):
+        self.spawners.pop(unique_identifier, None)
+        self.warned.discard(unique_identifier)
+
+    def ensure_started(self):
+        """
+        Start the periodic checks, if enabled and not already running. Must be called from within the running event loop.
+        """
+        if self.check_interval > 0 and self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.check_once()
+            except Exception as e:
+                self.upstream_logger.info(f"[IdleReclaimer] Idle check failed: {e!r}")
+
+    def _idle_seconds(self, spawner) -> Optional[float]:
+        last_activity = spawner.orm_spawner.last_activity if spawner.orm_spawner is not None else None
+        if last_activity is None:
+            return None
+        # JupyterHub stores naive UTC timestamps
+        if last_activity.tzinfo is None:
+            last_activity = last_activity.replace(tzinfo=timezone.utc)
+        return (datetime.now(timezone.utc) - last_activity).total_seconds()
+
+    async def _evaluate(self, unique_identifier: str, allocation: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Return a report entry if the given exclusive allocation is idle according to its machine type's policy, None otherwise.
+        """
+        machine = allocation['machine']
+        spawner = self.spawners.get(unique_identifier)
+        if spawner is None:
+            return None
+
+        idle_seconds = self._idle_seconds(spawner)
+        if idle_seconds is None or idle_seconds < machine.idle_timeout:
+            self.warned.discard(unique_identifier)
+            return None
+
+        sample = await spawner.notebook_manager.sample_utilization(self.sample_seconds)
+        if sample is None:
+            # Never reclaim on missing data
+            return None
+        cpu, gpu = sample
+        if cpu >= machine.idle_cpu_threshold or (gpu is not None and gpu >= machine.idle_gpu_threshold):
+            return None
+
+        # A type without shared access cannot be downgraded, so the best we can do is warn
+        action = machine.idle_action
+        if action == "downgrade" and not machine.shared_access_enabled:
+            action = "warn"
+
+        return {
+            "user": unique_identifier,
+            "hostname": allocation['hostname'],
+            "codename": machine.codename,
+            "idle_seconds": int(idle_seconds),
+            "cpu": cpu,
+            "gpu": gpu,
+            "action": action
+        }
+
+    async def check_once(self, dry_run: Optional[bool] = None) -> Dict[str, Any]:
+        """
+        Check every exclusive allocation with an idle policy once, apply the policies (unless in dry-run mode),
+        and return the report. dry_run overrides the configured mode for this check only.
+        """
+        dry_run = self.dry_run if dry_run is None else dry_run
+
+        # Work on a copy; allocations may change while the samples are being taken
+        exclusive_allocations = [
+            (unique_identifier, allocation) for unique_identifier, allocation in list(self.machine_manager.allocations.items())
+            if not allocation['shared_access_enabled'] and allocation['machine'].idle_timeout > 0
+        ]
+        entries = await asyncio.gather(*[self._evaluate(unique_identifier, allocation) for unique_identifier, allocation in exclusive_allocations])
+        entries = [entry for entry in entries if entry is not None]
+
+        recoverable_hosts: Dict[str, int] = {}
+        for entry in entries:
+            if entry["action"] != "warn":
+                recoverable_hosts[entry["codename"]] = recoverable_hosts.get(entry["codename"], 0) + 1
+            if not dry_run:
+                await self._apply(entry)
+
+        report = {
+            "dry_run": dry_run,
+            "checked_at": datetime.now(timezone.utc).isoformat(),
+            "exclusive_allocations_checked": len(exclusive_allocations),
+            "idle": entries,
+            "recoverable_hosts": recoverable_hosts
+        }
+        self.last_report = report
+        self.upstream_logger.info(f"[IdleReclaimer] {'Dry run: ' if dry_run else ''}{len(entries)} idle exclusive allocations out of {len(exclusive_allocations)}, recoverable hosts per type: {recoverable_hosts}")
+        return report
+
+    async def _apply(self, entry: Dict[str, Any]):
+        unique_identifier = entry["user"]
+        action = entry["action"]
+
+        if action == "downgrade":
+            with self.machine_manager_lock:
+                downgraded = self.machine_manager.downgrade_to_shared(unique_identifier)
+            if downgraded:
+                return
+            action = "warn"
+
+        if action == "stop":
+            spawner = self.spawners.get(unique_identifier)
+            if spawner is None:
+                return
+            if spawner.pending:
+                # Already starting or stopping; look again on the next check
+                return
+            self.upstream_logger.info(f"[IdleReclaimer] Stopping the idle notebook of {unique_identifier} on {entry['hostname']} (idle for {entry['idle_seconds']}s).")
+            # Same order as the hub's own stop handler: User.stop only stops the spawner (which releases the machine),
+            # so the proxy route is removed first, rather than lingering until the hub's periodic route check
+            proxy = spawner.user.settings.get("proxy")
+            if proxy is not None:
+                try:
+                    await proxy.delete_user(spawner.user, spawner.name)
+                except Exception as e:
+                    self.upstream_logger.info(f"[IdleReclaimer] Unable to remove the proxy route of {unique_identifier}: {e!r}")
+            await spawner.user.stop(spawner.name)
+            return
+
+        if unique_identifier not in self.warned:
+            self.warned.add(unique_identifier)
+            self.upstream_logger.warning(f"[IdleReclaimer] {unique_identifier} has held {entry['hostname']} ({entry['codename']}) exclusively while idle for {entry['idle_seconds']}s (CPU {entry['cpu']}%, GPU {entry['gpu']}%).")
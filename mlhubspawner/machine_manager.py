@@ -1,15 +1,37 @@
 import socket
-from typing import Any, Dict, List, Optional
+import logging
+from typing import AbstractSet, Any, Dict, List, Optional
 from .remote_hosts.remote_generic_host import RemoteGenericHost
+from .tracing import Tracer
+from .occupancy_recorder import OccupancyRecorder
+from .allocation_events import AllocationEventLogger
 
 class MachineManager:
-    def __init__(self, upstream_logger , remote_hosts: List[RemoteGenericHost]):
+    def __init__(self, upstream_logger , remote_hosts: List[RemoteGenericHost], affinity_enabled: bool = False, affinity_load_tolerance: int = 0, tracer: Optional[Tracer] = None, occupancy: Optional[OccupancyRecorder] = None, log_sample_rate: float = 1.0):
         self.upstream_logger = upstream_logger
         self.remote_hosts = remote_hosts
+        # Maps codename -> machine type of the current host catalog
+        self.types_by_codename: Dict[str, RemoteGenericHost] = {host.codename: host for host in remote_hosts}
+        # Hostnames removed from the catalog that still carry allocations. No new placements go there; they are
+        # forgotten once their last allocation is released.
+        self.draining_hostnames = set()
         # Maps unique_identifier -> allocation details
         self.allocations: Dict[str, Dict[str, Any]] = {}
         # Maps hostname -> list of unique_identifiers allocated to that hostname
         self.hostname_allocations: Dict[str, List[str]] = {}
+        # Maps unique_identifier -> hostname the user was last placed on. Survives releases, since the
+        # user's venv, caches and home directory contents stay on that host.
+        self.host_affinity: Dict[str, str] = {}
+        # Whether placement should prefer the host the user is already warm on
+        self.affinity_enabled = affinity_enabled
+        # How many more allocations than the least loaded eligible host the affinity host may carry and still be preferred
+        self.affinity_load_tolerance = affinity_load_tolerance
+        # Tracing is disabled unless a configured tracer is handed in
+        self.tracer = tracer if tracer is not None else Tracer()
+        # Occupancy history of every host and machine type, kept up to date on every take and release
+        self.occupancy = occupancy if occupancy is not None else OccupancyRecorder(upstream_logger)
+        # Structured, lazily formatted events for the allocation hot paths, which run under the allocation lock
+        self.events = AllocationEventLogger(upstream_logger, log_sample_rate)
 
 
     def is_machine_online(self, hostname_ip: str) -> bool:
@@ -17,18 +39,93 @@ class MachineManager:
         Check if the machine at hostname_ip (format "ip:port") is online by trying to connect
         to the specified port with a 2-second timeout.
         """
-        try:
-            ip, port_str = hostname_ip.split(":")
-            port = int(port_str)
-            with socket.create_connection((ip, port), timeout=2):
-                return True
-        except Exception:
-            return False
+        with self.tracer.span("MachineManager.probe", host=hostname_ip):
+            try:
+                ip, port_str = hostname_ip.split(":")
+                port = int(port_str)
+                with socket.create_connection((ip, port), timeout=2):
+                    return True
+            except Exception:
+                return False
+
+    def get_type(self, codename: str) -> Optional[RemoteGenericHost]:
+        """
+        Return the machine type with the given codename from the current host catalog, or None if it was removed.
+        """
+        return self.types_by_codename.get(codename)
+
+    def get_hostnames(self) -> List[str]:
+        """
+        Return every hostname of the current host catalog that is not being drained.
+        """
+        return sorted({hostname for host in self.remote_hosts for hostname in host.hostnames} - self.draining_hostnames)
+
+    def knows_hostname(self, hostname: str) -> bool:
+        """
+        Whether the hostname is part of the current host catalog, or is still being drained.
+        """
+        return hostname in self.draining_hostnames or any(hostname in host.hostnames for host in self.remote_hosts)
 
-    def find_machine(self, chosen_machine_type: RemoteGenericHost, requested_shared_mode: bool) -> Optional[str]:
+    def apply_host_catalog(self, new_remote_hosts: List[RemoteGenericHost]) -> Dict[str, List[str]]:
+        """
+        Replace the host catalog with new_remote_hosts, as an incremental diff against the current one.
+
+        - Added hostnames are schedulable right away.
+        - Removed hostnames without allocations are simply forgotten. Removed hostnames with allocations are drained:
+          the running sessions are kept, but no new placements go there.
+        - Draining hostnames that are added back stop draining.
+
+        Existing allocations keep referring to the machine type they were taken with; new requests are always
+        resolved against the new catalog by codename.
+        Returns the hostnames that were added, removed and are now draining.
+
+        This function must be executed atomically (i.e. under an external mutex lock).
+        """
+        old_hostnames = {hostname for host in self.remote_hosts for hostname in host.hostnames}
+        new_hostnames = {hostname for host in new_remote_hosts for hostname in host.hostnames}
+        added = sorted(new_hostnames - old_hostnames)
+        removed = sorted(old_hostnames - new_hostnames)
+
+        self.remote_hosts = new_remote_hosts
+        self.types_by_codename = {host.codename: host for host in new_remote_hosts}
+
+        self.draining_hostnames -= new_hostnames
+        for hostname in removed:
+            if self.hostname_allocations.get(hostname):
+                self.draining_hostnames.add(hostname)
+
+        summary = {"added": added, "removed": removed, "draining": sorted(self.draining_hostnames)}
+        self.upstream_logger.info("[MachineManager] Applied new host catalog with %d machine types. Added: %s, removed: %s, draining: %s", len(new_remote_hosts), added, removed, summary["draining"])
+        return summary
+
+    def get_affinity(self, unique_identifier: str) -> Optional[str]:
+        """
+        Return the hostname the given unique identifier was last placed on, if any.
+        """
+        return self.host_affinity.get(unique_identifier)
+
+    def restore_affinity(self, unique_identifier: str, hostname: Optional[str]):
+        """
+        Restore a previously persisted host affinity (e.g. from the spawner state after a hub restart).
+        Only hostnames that are still part of the current host catalog are accepted.
+        """
+        if not hostname:
+            return
+        if not any(hostname in host.hostnames for host in self.remote_hosts):
+            self.upstream_logger.info("[MachineManager] Ignoring stale host affinity %s for UID %s", hostname, unique_identifier)
+            return
+        self.host_affinity[unique_identifier] = hostname
+
+    def find_machine(self, chosen_machine_type: RemoteGenericHost, requested_shared_mode: bool, unique_identifier: Optional[str] = None, excluded_hostnames: AbstractSet[str] = frozenset()) -> Optional[str]:
         """
         Return an available machine hostname for the given machine type and requested access mode.
 
+        If affinity placement is enabled and a unique_identifier is given, the host the user was last placed on
+        is tried first (see _find_affinity_machine). Otherwise, or if that host is not eligible, the load-based
+        placement below is used.
+
+        Hosts in excluded_hostnames (e.g. those with too many launches in progress) are skipped without being probed.
+
         For an exclusive request (requested_shared_mode == False):
         - The machine is eligible if it is completely free (no allocations) and is online.
 
@@ -40,54 +137,116 @@ class MachineManager:
 
         Note: This method must be called under an external mutex lock.
         """
-        # If they asked for shared but the type doesn’t support it, bail out
-        if requested_shared_mode and not chosen_machine_type.shared_access_enabled:
-            self.upstream_logger.info("[MachineManager] Requested shared mode but machine type %s does not support shared access.", chosen_machine_type.codename)
-            return None
+        with self.tracer.span("MachineManager.find_machine", codename=chosen_machine_type.codename, shared=requested_shared_mode):
+            # The request may have been made against an older catalog; only the current hostnames of the type are eligible
+            current_machine_type = self.get_type(chosen_machine_type.codename)
+            if current_machine_type is None:
+                self.events.emit(logging.INFO, "placement_failed", codename=chosen_machine_type.codename, uid=unique_identifier, reason="type_removed")
+                return None
+            chosen_machine_type = current_machine_type
+
+            # If they asked for shared but the type doesn’t support it, bail out
+            if requested_shared_mode and not chosen_machine_type.shared_access_enabled:
+                self.events.emit(logging.INFO, "placement_failed", codename=chosen_machine_type.codename, uid=unique_identifier, reason="shared_unsupported")
+                return None
 
-        # Exclusive request: choose the first online host with zero allocations
-        if not requested_shared_mode:
+            # Outcome of every probe made by this call, so that no host is probed twice
+            probed: Dict[str, bool] = {}
+
+            # Affinity request: prefer the host the user is already warm on, if it is eligible
+            affinity_hostname = None
+            if self.affinity_enabled and unique_identifier is not None:
+                affinity_hostname = self._find_affinity_machine(chosen_machine_type, requested_shared_mode, unique_identifier, excluded_hostnames, probed)
+                if affinity_hostname is not None and (not requested_shared_mode or len(self.hostname_allocations.get(affinity_hostname, [])) <= self.affinity_load_tolerance):
+                    # No other host can beat it by more than the tolerance, so skip probing the rest of the fleet.
+                    self.events.emit(logging.INFO, "placement", codename=chosen_machine_type.codename, uid=unique_identifier, host=affinity_hostname, shared=requested_shared_mode, reason="affinity")
+                    return affinity_hostname
+
+            # Exclusive request: choose the first online host with zero allocations
+            if not requested_shared_mode:
+                for hostname in chosen_machine_type.hostnames:
+                    if hostname in excluded_hostnames:
+                        self.events.emit_sampled(logging.DEBUG, "probe", host=hostname, codename=chosen_machine_type.codename, outcome="excluded")
+                        continue
+                    allocs = self.hostname_allocations.get(hostname, [])
+                    if allocs:
+                        self.events.emit_sampled(logging.DEBUG, "probe", host=hostname, codename=chosen_machine_type.codename, outcome="in_use", allocations=len(allocs))
+                        continue
+                    if not self._probe(hostname, probed):
+                        self.events.emit_sampled(logging.DEBUG, "probe", host=hostname, codename=chosen_machine_type.codename, outcome="offline")
+                        continue
+                    self.events.emit_sampled(logging.DEBUG, "probe", host=hostname, codename=chosen_machine_type.codename, outcome="online", allocations=0)
+                    self.events.emit(logging.INFO, "placement", codename=chosen_machine_type.codename, uid=unique_identifier, host=hostname, shared=False, reason="free")
+                    return hostname
+                self.events.emit(logging.INFO, "placement_failed", codename=chosen_machine_type.codename, uid=unique_identifier, shared=False, reason="no_free_host")
+                return None
+
+            # Shared request: prefer the first zero-allocation host, otherwise track the fewest
+            selected_hostname = None
             for hostname in chosen_machine_type.hostnames:
-                self.upstream_logger.info("[MachineManager] Attempting hostname: %s (type: %s)", hostname, chosen_machine_type.codename)
-                if not self.is_machine_online(hostname):
-                    self.upstream_logger.info("[MachineManager] Hostname %s is offline, skipping.", hostname)
+                if hostname in excluded_hostnames:
+                    self.events.emit_sampled(logging.DEBUG, "probe", host=hostname, codename=chosen_machine_type.codename, outcome="excluded")
                     continue
                 allocs = self.hostname_allocations.get(hostname, [])
-                self.upstream_logger.info("[MachineManager] %s allocation count: %d", hostname, len(allocs))
+                # skip if any allocation was exclusive
+                if any(not self.allocations[UID]['shared_access_enabled'] for UID in allocs):
+                    self.events.emit_sampled(logging.DEBUG, "probe", host=hostname, codename=chosen_machine_type.codename, outcome="exclusive_present", allocations=len(allocs))
+                    continue
+                if not self._probe(hostname, probed):
+                    self.events.emit_sampled(logging.DEBUG, "probe", host=hostname, codename=chosen_machine_type.codename, outcome="offline")
+                    continue
+                self.events.emit_sampled(logging.DEBUG, "probe", host=hostname, codename=chosen_machine_type.codename, outcome="online", allocations=len(allocs))
+                # immediate pick if free
                 if not allocs:
-                    self.upstream_logger.info("[MachineManager] Hostname %s is free, selecting for exclusive allocation.", hostname)
+                    self.events.emit(logging.INFO, "placement", codename=chosen_machine_type.codename, uid=unique_identifier, host=hostname, shared=True, reason="free")
                     return hostname
-            self.upstream_logger.info("[MachineManager] No online, free hostname found for exclusive allocation for type %s.", chosen_machine_type.codename)
+                # otherwise pick the least-burdened so far
+                if selected_hostname is None or len(allocs) < len(self.hostname_allocations[selected_hostname]):
+                    selected_hostname = hostname
+
+            if selected_hostname:
+                # Keep the user on their affinity host as long as it is within the tolerance of the least loaded one
+                if affinity_hostname is not None:
+                    affinity_count = len(self.hostname_allocations.get(affinity_hostname, []))
+                    if affinity_count <= len(self.hostname_allocations[selected_hostname]) + self.affinity_load_tolerance:
+                        self.events.emit(logging.INFO, "placement", codename=chosen_machine_type.codename, uid=unique_identifier, host=affinity_hostname, shared=True, reason="affinity", allocations=affinity_count)
+                        return affinity_hostname
+                self.events.emit(logging.INFO, "placement", codename=chosen_machine_type.codename, uid=unique_identifier, host=selected_hostname, shared=True, reason="least_loaded", allocations=len(self.hostname_allocations[selected_hostname]))
+                return selected_hostname
+
+            self.events.emit(logging.INFO, "placement_failed", codename=chosen_machine_type.codename, uid=unique_identifier, shared=True, reason="no_eligible_host")
             return None
 
-        # Shared request: prefer the first zero-allocation host, otherwise track the fewest
-        selected_hostname = None
-        for hostname in chosen_machine_type.hostnames:
-            self.upstream_logger.info("[MachineManager] Attempting hostname: %s (type: %s)", hostname, chosen_machine_type.codename)
-            if not self.is_machine_online(hostname):
-                self.upstream_logger.info("[MachineManager] Hostname %s is offline, skipping.", hostname)
-                continue
-            allocs = self.hostname_allocations.get(hostname, [])
-            self.upstream_logger.info("[MachineManager] %s allocation count: %d", hostname, len(allocs))
-            # skip if any allocation was exclusive
-            if any(not self.allocations[UID]['shared_access_enabled'] for UID in allocs):
-                self.upstream_logger.info("[MachineManager] Exclusive allocation present on %s, skipping.", hostname)
-                continue
-            # immediate pick if free
-            if not allocs:
-                self.upstream_logger.info("[MachineManager] Hostname %s is free, selecting for shared allocation.", hostname)
-                return hostname
-            # otherwise pick the least-burdened so far
-            if selected_hostname is None or len(allocs) < len(self.hostname_allocations[selected_hostname]):
-                selected_hostname = hostname
 
-        if selected_hostname:
-            self.upstream_logger.info("[MachineManager] Selected hostname %s with allocation count %d for shared allocation.", selected_hostname, len(self.hostname_allocations[selected_hostname]))
-            return selected_hostname
+    def _find_affinity_machine(self, chosen_machine_type: RemoteGenericHost, requested_shared_mode: bool, unique_identifier: str, excluded_hostnames: AbstractSet[str] = frozenset(), probed: Optional[Dict[str, bool]] = None) -> Optional[str]:
+        """
+        Return the host the given unique identifier was last placed on, if it is still eligible for the request:
+        it must belong to the chosen machine type, not be excluded, be free (exclusive) or hold no exclusive
+        allocations (shared), and be online. Returns None otherwise.
+        The host is only probed once the cheap checks passed; the outcome is recorded in probed (see _probe).
 
-        self.upstream_logger.info("[MachineManager] No eligible hostname found for shared access for type %s.", chosen_machine_type.codename)
-        return None
+        Note: This method must be called under an external mutex lock.
+        """
+        hostname = self.host_affinity.get(unique_identifier)
+        if hostname is None or hostname not in chosen_machine_type.hostnames or hostname in excluded_hostnames:
+            return None
+        allocs = self.hostname_allocations.get(hostname, [])
+        if not requested_shared_mode and allocs:
+            return None
+        if requested_shared_mode and any(not self.allocations[UID]['shared_access_enabled'] for UID in allocs):
+            return None
+        if not self._probe(hostname, probed if probed is not None else {}):
+            self.events.emit_sampled(logging.DEBUG, "probe", host=hostname, codename=chosen_machine_type.codename, outcome="offline", affinity=True)
+            return None
+        return hostname
 
+    def _probe(self, hostname: str, probed: Dict[str, bool]) -> bool:
+        """
+        Whether the host is online, probing it only if probed (the outcomes of the current placement) has no entry for it yet.
+        """
+        if hostname not in probed:
+            probed[hostname] = self.is_machine_online(hostname)
+        return probed[hostname]
 
     def take_machine(self, chosen_machine_type: RemoteGenericHost, machine_ip_port: str, unique_identifier: str, requested_shared_mode: bool):
         """
@@ -102,71 +261,136 @@ class MachineManager:
         
         This function must be executed atomically (i.e. under an external mutex lock).
         """
-        self.upstream_logger.info("[MachineManager] Attempting to take machine with codename %s, address %s, with UID %s (shared: %s)", 
-                     chosen_machine_type.codename, machine_ip_port, unique_identifier, requested_shared_mode)
-
-        if requested_shared_mode and not chosen_machine_type.shared_access_enabled:
-            self.upstream_logger.info("[MachineManager] Machine type with codename %s does not support shared access for machine %s", 
-                         chosen_machine_type.codename, machine_ip_port)
-            return False
+        with self.tracer.span("MachineManager.take_machine", codename=chosen_machine_type.codename, host=machine_ip_port, shared=requested_shared_mode):
+            current_machine_type = self.get_type(chosen_machine_type.codename)
+            if current_machine_type is None or machine_ip_port not in current_machine_type.hostnames:
+                self.events.emit(logging.INFO, "take_rejected", host=machine_ip_port, codename=chosen_machine_type.codename, uid=unique_identifier, shared=requested_shared_mode, reason="not_in_catalog")
+                return False
+            chosen_machine_type = current_machine_type
 
-        if not requested_shared_mode:
-            if machine_ip_port in self.hostname_allocations and self.hostname_allocations[machine_ip_port]:
-                self.upstream_logger.info("[MachineManager] Machine %s (codename: %s) is already allocated exclusively. Cannot take machine.", 
-                             machine_ip_port, chosen_machine_type.codename)
+            if requested_shared_mode and not chosen_machine_type.shared_access_enabled:
+                self.events.emit(logging.INFO, "take_rejected", host=machine_ip_port, codename=chosen_machine_type.codename, uid=unique_identifier, shared=requested_shared_mode, reason="shared_unsupported")
                 return False
-        else:
-            uids = self.hostname_allocations.get(machine_ip_port, [])
-            for uid in uids:
-                if self.allocations[uid]['shared_access_enabled'] is False:
-                    self.upstream_logger.info("[MachineManager] Machine %s (codename: %s) already has an exclusive allocation (UID: %s). Cannot share.", 
-                                 machine_ip_port, chosen_machine_type.codename, uid)
+
+            if not requested_shared_mode:
+                if machine_ip_port in self.hostname_allocations and self.hostname_allocations[machine_ip_port]:
+                    self.events.emit(logging.INFO, "take_rejected", host=machine_ip_port, codename=chosen_machine_type.codename, uid=unique_identifier, shared=requested_shared_mode, reason="host_in_use")
                     return False
+            else:
+                uids = self.hostname_allocations.get(machine_ip_port, [])
+                for uid in uids:
+                    if self.allocations[uid]['shared_access_enabled'] is False:
+                        self.events.emit(logging.INFO, "take_rejected", host=machine_ip_port, codename=chosen_machine_type.codename, uid=unique_identifier, shared=requested_shared_mode, reason="exclusive_present", holder=uid)
+                        return False
+
+            self._register_allocation(chosen_machine_type, machine_ip_port, unique_identifier, requested_shared_mode)
+            self.events.emit(logging.INFO, "take", host=machine_ip_port, codename=chosen_machine_type.codename, uid=unique_identifier, shared=requested_shared_mode, host_allocations=len(self.hostname_allocations[machine_ip_port]))
+            self.events.emit_debug_dump(machine_ip_port, self.hostname_allocations[machine_ip_port])
+            return True
+
+    def restore_allocation(self, unique_identifier: str, codename: Optional[str], machine_ip_port: str, shared_access_enabled: Optional[bool]) -> bool:
+        """
+        Register the allocation of a notebook that survived a hub restart (from the spawner state), so that it
+        counts for placement and is seen by the IdleReclaimer again.
+
+        Unlike take_machine, the host is not checked for room: the notebook is already running there.
+        The machine type must still exist and list the hostname. States saved by older versions, which
+        carry no codename or access mode, cannot be restored.
+
+        This function must be executed atomically (i.e. under an external mutex lock).
+        """
+        if unique_identifier in self.allocations:
+            return self.allocations[unique_identifier]['hostname'] == machine_ip_port
+        machine_type = self.get_type(codename) if codename else None
+        if machine_type is None or machine_ip_port not in machine_type.hostnames or shared_access_enabled is None:
+            self.events.emit(logging.INFO, "restore_rejected", host=machine_ip_port, codename=codename, uid=unique_identifier, shared=shared_access_enabled)
+            return False
 
-        # Register the allocation.
+        self._register_allocation(machine_type, machine_ip_port, unique_identifier, shared_access_enabled)
+        self.events.emit(logging.INFO, "restore", host=machine_ip_port, codename=codename, uid=unique_identifier, shared=shared_access_enabled, host_allocations=len(self.hostname_allocations[machine_ip_port]))
+        return True
+
+    def _register_allocation(self, machine_type: RemoteGenericHost, machine_ip_port: str, unique_identifier: str, shared_access_enabled: bool):
         self.allocations[unique_identifier] = {
-            'machine': chosen_machine_type,
+            'machine': machine_type,
             'hostname': machine_ip_port,
-            'shared_access_enabled': requested_shared_mode
+            'shared_access_enabled': shared_access_enabled
         }
 
         if machine_ip_port not in self.hostname_allocations:
             self.hostname_allocations[machine_ip_port] = []
         self.hostname_allocations[machine_ip_port].append(unique_identifier)
-
-        self.upstream_logger.info("[MachineManager] Successfully allocated machine %s (codename: %s) to UID %s. Current allocations:\n%s", 
-                     machine_ip_port, chosen_machine_type.codename, unique_identifier,
-                     "\n".join(str(uid) for uid in self.hostname_allocations[machine_ip_port]))
-        return True
+        self.host_affinity[unique_identifier] = machine_ip_port
+        self.occupancy.record_change(machine_ip_port, machine_type.codename, shared_access_enabled, 1)
 
     def release_machine(self, unique_identifier: str):
         """
         Release the allocation associated with the given unique identifier.
         This method removes the allocation from both the allocations and the hostname_allocations dictionaries.
         """
-        if unique_identifier not in self.allocations:
-            self.upstream_logger.info("[MachineManager] Attempted to release non-existing allocation with UID %s", unique_identifier)
-            return
+        with self.tracer.span("MachineManager.release_machine"):
+            if unique_identifier not in self.allocations:
+                self.events.emit(logging.INFO, "release_missing", uid=unique_identifier)
+                return
+
+            allocation = self.allocations[unique_identifier]
+            hostname = allocation['hostname']
+            codename = allocation['machine'].codename
 
-        allocation = self.allocations[unique_identifier]
-        hostname = allocation['hostname']
-        codename = allocation['machine'].codename
-
-        self.upstream_logger.info("[MachineManager] Releasing machine %s (codename: %s) allocated to UID %s", hostname, codename, unique_identifier)
-
-        # Remove from the allocations dictionary.
-        del self.allocations[unique_identifier]
-
-        # Remove from the hostname_allocations dictionary.
-        if hostname in self.hostname_allocations:
-            if unique_identifier in self.hostname_allocations[hostname]:
-                self.hostname_allocations[hostname].remove(unique_identifier)
-                self.upstream_logger.info("[MachineManager] Removed UID %s from machine %s (codename: %s). Remaining allocations:\n%s", 
-                             unique_identifier, hostname, codename,
-                             "\n".join(str(uid) for uid in self.hostname_allocations[hostname]))
-            if not self.hostname_allocations[hostname]:
-                del self.hostname_allocations[hostname]
-                self.upstream_logger.info("[MachineManager] No more allocations for machine %s (codename: %s). Hostname removed from records.", hostname, codename)
+            # Remove from the allocations dictionary.
+            del self.allocations[unique_identifier]
+            self.occupancy.record_change(hostname, codename, allocation['shared_access_enabled'], -1)
+
+            # Remove from the hostname_allocations dictionary.
+            if hostname in self.hostname_allocations:
+                if unique_identifier in self.hostname_allocations[hostname]:
+                    self.hostname_allocations[hostname].remove(unique_identifier)
+                self.events.emit(logging.INFO, "release", host=hostname, codename=codename, uid=unique_identifier, host_allocations=len(self.hostname_allocations[hostname]))
+                self.events.emit_debug_dump(hostname, self.hostname_allocations[hostname])
+                if not self.hostname_allocations[hostname]:
+                    del self.hostname_allocations[hostname]
+                    if hostname in self.draining_hostnames:
+                        self.draining_hostnames.discard(hostname)
+                        self.events.emit(logging.INFO, "drained", host=hostname, codename=codename)
+
+    def snapshot_allocations(self) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Return every current allocation, grouped by hostname. This is the on-demand replacement for the
+        allocation dumps that used to be logged on every take and release.
+
+        This function must be executed atomically (i.e. under an external mutex lock).
+        """
+        snapshot = {}
+        for hostname, uids in self.hostname_allocations.items():
+            snapshot[hostname] = [
+                {
+                    "uid": uid,
+                    "codename": self.allocations[uid]['machine'].codename,
+                    "shared": self.allocations[uid]['shared_access_enabled']
+                }
+                for uid in uids
+            ]
+        return snapshot
+
+    def downgrade_to_shared(self, unique_identifier: str) -> bool:
+        """
+        Turn the exclusive allocation of the given unique identifier into a shared one, so that other shared
+        requests can be placed next to it. Only possible if the allocation's machine type supports sharing.
+
+        This function must be executed atomically (i.e. under an external mutex lock).
+        """
+        allocation = self.allocations.get(unique_identifier)
+        if allocation is None or allocation['shared_access_enabled']:
+            return False
+        if not allocation['machine'].shared_access_enabled:
+            self.upstream_logger.info("[MachineManager] Cannot downgrade UID %s, machine type %s does not support shared access.", unique_identifier, allocation['machine'].codename)
+            return False
+
+        allocation['shared_access_enabled'] = True
+        self.occupancy.record_change(allocation['hostname'], allocation['machine'].codename, False, -1)
+        self.occupancy.record_change(allocation['hostname'], allocation['machine'].codename, True, 1)
+        self.upstream_logger.info("[MachineManager] Downgraded the allocation of UID %s on %s to shared access.", unique_identifier, allocation['hostname'])
+        return True
 
     def get_available_types(self, user_privilege_level: int) -> List[RemoteGenericHost]:
         """
@@ -1,10 +1,16 @@
 import re
 import uuid
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from urllib3.exceptions import HTTPError
 from minio import Minio
-from minio.error import S3Error
+from minio.error import S3Error, ServerError
+
+# S3 error codes worth retrying; any other S3 error (AccessDenied, InvalidBucketName, ...) fails the same way every time
+TRANSIENT_S3_ERROR_CODES = {"InternalError", "ServiceUnavailable", "SlowDown", "RequestTimeout", "OperationAborted"}
 
 class MinIOManager:
-    def __init__(self, minio_url: str, minio_access_key: str, minio_secret_key: str):
+    def __init__(self, minio_url: str, minio_access_key: str, minio_secret_key: str, max_workers: int = 4, max_attempts: int = 3, retry_backoff: float = 0.5):
         """
         Initialize the MinIOManager with the provided URL and credentials.
         
@@ -16,6 +22,9 @@ class MinIOManager:
             minio_url (str): URL of the MinIO server, starting with either "http://" or "https://".
             minio_access_key (str): Access key for the MinIO server.
             minio_secret_key (str): Secret key for the MinIO server.
+            max_workers (int): Size of the executor running the blocking MinIO calls for the async methods.
+            max_attempts (int): How many times a failing MinIO call is attempted by the async methods.
+            retry_backoff (float): Delay before the first retry, in seconds. It doubles with each further retry.
         """
         # Validate and determine the secure flag based on the URL prefix.
         if minio_url.startswith("https://"):
@@ -33,11 +42,22 @@ class MinIOManager:
             secret_key=minio_secret_key,
             secure=secure
         )
-    
+
+        # The blocking MinIO client never runs on the event loop, and never more than max_workers calls at a time.
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="minio")
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+
+        # Buckets known to exist. Buckets are never deleted by the hub, so once known, a bucket needs no more network calls.
+        self.known_buckets = set()
+        # Loads known_buckets in bulk, once. Created lazily, since there is no event loop yet when the hub builds the spawner class.
+        self._known_buckets_task = None
+
+    @staticmethod
     def generate_fallback_oid(raw_uid: str) -> str:
         """
         Produce a bucket-safe identifier by:
-          1. Stripping out any character except A–Z, a–z, 0–9, and dash.
+          1. Stripping out any character except A–Z, a–z, 0–9, and dash, and lowercasing the rest (bucket names are lowercase).
           2. Falling back to a random UUID hex if the result is empty.
           3. Prefixing with 'nouid-'.
         
@@ -48,7 +68,7 @@ class MinIOManager:
             str: A sanitized identifier safe for bucket names.
         """
         # Remove all but letters, digits, and dashes
-        sanitized = re.sub(r"[^A-Za-z0-9-]", "", raw_uid or "")
+        sanitized = re.sub(r"[^A-Za-z0-9-]", "", raw_uid or "").lower()
         if not sanitized:
             # If nothing left, generate a random hex string
             sanitized = uuid.uuid4().hex
@@ -73,3 +93,80 @@ class MinIOManager:
             return False
         except Exception:
             return False
+
+    @staticmethod
+    def is_transient_error(error: Exception) -> bool:
+        """
+        Whether a failed MinIO call may succeed if retried: network errors, 5xx responses, and throttling.
+        """
+        if isinstance(error, S3Error):
+            status = error.response.status if error.response is not None else None
+            return error.code in TRANSIENT_S3_ERROR_CODES or (status is not None and status >= 500)
+        if isinstance(error, ServerError):
+            return error.status_code >= 500
+        return isinstance(error, (HTTPError, ConnectionError, TimeoutError))
+
+    async def _run_with_retries(self, function, *args):
+        """
+        Run a blocking MinIO call in the executor, retrying transient failures with exponential backoff.
+        Permanent failures are raised right away, and the last exception is raised if every attempt fails.
+        """
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.max_attempts):
+            try:
+                return await loop.run_in_executor(self.executor, function, *args)
+            except Exception as error:
+                if attempt == self.max_attempts - 1 or not self.is_transient_error(error):
+                    raise
+                await asyncio.sleep(self.retry_backoff * (2 ** attempt))
+
+    async def _load_known_buckets(self):
+        buckets = await self._run_with_retries(self.client.list_buckets)
+        self.known_buckets.update(bucket.name for bucket in buckets)
+
+    def preload(self):
+        """
+        Start loading all existing buckets in bulk through list_buckets, if not already started.
+        Must be called from within the running event loop. Returns the loading task.
+        """
+        if self._known_buckets_task is None:
+            self._known_buckets_task = asyncio.ensure_future(self._load_known_buckets())
+        return self._known_buckets_task
+
+    async def ensure_bucket(self, bucket_name: str) -> bool:
+        """
+        Async counterpart of create(), which makes no network calls at all for buckets that are already known.
+
+        The first call waits for the bulk preload. If the preload failed, it is retried on the next call, and
+        in the meantime buckets are checked one by one.
+
+        Parameters:
+            bucket_name (str): The name of the bucket to be created.
+
+        Returns:
+            bool: True if the bucket exists or is successfully created; False if there's an error.
+        """
+        if bucket_name in self.known_buckets:
+            return True
+
+        try:
+            await asyncio.shield(self.preload())
+        except Exception:
+            # Let the next call retry the preload from scratch
+            self._known_buckets_task = None
+
+        if bucket_name in self.known_buckets:
+            return True
+
+        try:
+            if not await self._run_with_retries(self.client.bucket_exists, bucket_name):
+                await self._run_with_retries(self.client.make_bucket, bucket_name)
+        except S3Error as error:
+            # BucketAlreadyOwnedByYou means a concurrent spawn (or a retried call) got there first
+            if error.code != "BucketAlreadyOwnedByYou":
+                return False
+        except Exception:
+            return False
+
+        self.known_buckets.add(bucket_name)
+        return True
@@ -1,6 +1,6 @@
 
 # JupyterHub imports
-from traitlets import List, Instance, Unicode
+from traitlets import List, Instance, Unicode, Enum, Integer, Float, Bool
 from jupyterhub.spawner import Spawner
 
 # Local imports
@@ -13,9 +13,16 @@ from .account_manager import get_privilege, get_safe_username
 from .machine_manager import MachineManager
 from .notebook_manager import NotebookManager
 from .minio_manager import MinIOManager
+from .poll_scheduler import PollScheduler
+from .tracing import Tracer, FileSpanExporter
+from .occupancy_recorder import OccupancyRecorder
+from .idle_reclaimer import IdleReclaimer
+from .fleet_config import FleetConfigWatcher
+from .admission_controller import AdmissionController
+from .package_cache import PackageCachePrewarmer
 
 # Python imports
-import time
+import asyncio
 from threading import Lock
 
 class MLHubSpawner(Spawner):
@@ -23,10 +30,64 @@ class MLHubSpawner(Spawner):
     # Remote hosts read from the configuration file. This is initialized per-instance!!
     remote_hosts = List(DictionaryInstanceParser(RemoteMLHost), help="Possible remote hosts from which to choose remote_host.", config=True)
 
+    # Hot-reloadable fleet configuration
+    fleet_config_file = Unicode("", help="Path of a JSON file holding a list of remote_hosts entries. If set, it replaces remote_hosts, and is re-applied without a hub restart whenever it changes.", config=True)
+    fleet_config_poll_interval = Integer(30, help="Seconds between two checks of fleet_config_file for changes (0 disables the checks).", config=True)
+
     # MinIO credentials and URLs
     minio_url = Unicode(help="The URL endpoint for the MinIO server.", config=True)
     minio_access_key = Unicode(help="Access key for MinIO authentication.", config=True)
     minio_secret_key = Unicode(help="Secret key for MinIO authentication.", config=True)
+    minio_max_workers = Integer(4, help="Maximum number of concurrent MinIO calls made on behalf of spawns.", config=True)
+
+    # Placement strategy
+    placement_strategy = Enum(["balanced", "affinity"], default_value="balanced", help="How to place users on hosts. 'balanced' picks the least loaded eligible host, 'affinity' prefers the host the user was last placed on (where their venv, caches and data already live) and falls back to 'balanced'.", config=True)
+    affinity_load_tolerance = Integer(1, help="With the 'affinity' placement strategy, how many more allocations than the least loaded eligible host the user's previous host may have and still be preferred. Higher values favour warm hosts, lower values favour balance.", config=True)
+
+    # Allocation logging
+    allocation_log_sample_rate = Float(1.0, help="Fraction of the per-host probe events (debug level) that are logged during placement.", config=True)
+
+    # Spawn admission control. Rates are per minute; a rate or maximum of 0 disables the limit.
+    spawn_user_rate = Float(2, help="Spawn attempts per minute allowed for each user, after the initial burst.", config=True)
+    spawn_user_burst = Integer(3, help="Number of spawn attempts a user may make in quick succession.", config=True)
+    spawn_type_rate = Float(0, help="Spawn attempts per minute allowed for each machine type, after the initial burst.", config=True)
+    spawn_type_burst = Integer(20, help="Number of spawn attempts a machine type may receive in quick succession.", config=True)
+    max_launches_per_host = Integer(0, help="Maximum number of notebook launches in progress at once on a single host.", config=True)
+
+    # Shared package cache. Its path is passed to initialSetup.sh, which links every venv against it.
+    package_cache_path = Unicode("", help="Path, identical on every host, of a shared read-mostly package cache (prebuilt wheels and prewarmed site-packages). Disabled when empty.", config=True)
+    package_cache_packages = List(Unicode(), help="Requirements (pip specifiers) with which the hub prewarms the shared package cache of every host.", config=True)
+    package_cache_user = Unicode("", help="User the hub connects as to prewarm the shared package cache; it must own package_cache_path. Prewarming is disabled when empty.", config=True)
+
+    # Notebook launcher (resources/launcher.sh). Installed once per host if both are set, otherwise once per user and host, in ~/.mlhub.
+    launcher_directory = Unicode("", help="Absolute path, identical on every host, of a directory into which the hub installs the notebook launcher once per host. Every user must be able to read it.", config=True)
+    launcher_install_user = Unicode("", help="User the hub connects as to install the launcher into launcher_directory; it must be able to write there.", config=True)
+
+    # Notebook teardown
+    notebook_stop_grace_period = Integer(10, help="Seconds to wait after sending SIGTERM to the notebook and its kernels before escalating to SIGKILL. Keep it above jupyter_client's own kernel shutdown wait (5s), so the notebook server gets to shut its kernels down first.", config=True)
+
+    # Poll scheduling. JupyterHub polls every poll_interval; these decide which of those polls reach the remote host.
+    poll_min_interval = Float(30, help="Seconds between remote liveness checks for recently launched or flaky notebooks.", config=True)
+    poll_max_interval = Float(300, help="Seconds between remote liveness checks for notebooks that have been stable for poll_stable_after seconds.", config=True)
+    poll_stable_after = Float(3600, help="Seconds a notebook must pass its checks for before it is polled at poll_max_interval.", config=True)
+    poll_jitter = Float(0.3, help="Fraction of the interval by which each remote check may be brought forward, to spread checks out.", config=True)
+    poll_max_staleness = Float(600, help="Maximum age, in seconds, of a cached liveness result. Older results are always re-checked.", config=True)
+    poll_host_rate_limit = Float(2, help="Maximum number of remote liveness checks per second towards a single host (0 disables the limit).", config=True)
+
+    # Tracing
+    tracing_file = Unicode("", help="Path of a file to which spawn lifecycle spans are appended, in OTLP/JSON format. Tracing is disabled when empty.", config=True)
+    tracing_file_max_bytes = Integer(100 * 1024 * 1024, help="Size in bytes beyond which tracing_file is rotated (0 disables rotation).", config=True)
+    tracing_file_backup_count = Integer(3, help="Number of rotated tracing files kept (tracing_file.1 being the most recent).", config=True)
+
+    # Occupancy history
+    occupancy_resolution = Integer(60, help="Seconds covered by each slot of the occupancy history.", config=True)
+    occupancy_capacity = Integer(10080, help="Number of slots of occupancy history kept in memory. The defaults keep one week.", config=True)
+    occupancy_snapshot_file = Unicode("", help="Path of a local file to which the occupancy history is periodically saved, and from which it is restored at startup. Disabled when empty.", config=True)
+    occupancy_snapshot_interval = Integer(300, help="Seconds between two occupancy history snapshots.", config=True)
+
+    # Idle reclamation. The idle policies themselves are configured per machine type, see RemoteGenericHost.idle_timeout.
+    idle_check_interval = Integer(300, help="Seconds between two checks for idle exclusive allocations (0 disables the checks).", config=True)
+    idle_reclaim_dry_run = Bool(False, help="Only report the idle exclusive allocations and the capacity that would be recovered, without applying any idle policy.", config=True)
 
     # Class-level MachineManager for load balancing
     _machine_manager = None
@@ -37,21 +98,74 @@ class MLHubSpawner(Spawner):
     # Class-level singleton instance for MinIOManager
     _minio_manager = None
 
+    # Class-level Tracer, shared with the managers
+    _tracer = None
+
+    # Class-level IdleReclaimer, watching the exclusive allocations of all spawners
+    _idle_reclaimer = None
+
+    # Class-level FleetConfigWatcher, only created when fleet_config_file is set
+    _fleet_config_watcher = None
+
+    # Class-level PollScheduler, shared by all spawners so the per-host rate limits apply across users
+    _poll_scheduler = None
+
+    # Class-level PackageCachePrewarmer, only created when prewarming is configured
+    _package_cache_prewarmer = None
+
+    # Class-level AdmissionController, shared by all spawners so the per-type and per-host limits apply across users
+    _admission_controller = None
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
         #=== SINGLETONS ===
         cls = type(self)
+        if cls._tracer is None:
+            cls._tracer = Tracer(FileSpanExporter(self.tracing_file, max_bytes = self.tracing_file_max_bytes, backup_count = self.tracing_file_backup_count) if self.tracing_file else None)
+
         if cls._machine_manager is None:
             # Here, self.remote_hosts is fully initialized by traitlets.
-            cls._machine_manager = MachineManager(self.log, self.remote_hosts)
+            occupancy = OccupancyRecorder(self.log, self.occupancy_resolution, self.occupancy_capacity, self.occupancy_snapshot_file, self.occupancy_snapshot_interval)
+            cls._machine_manager = MachineManager(self.log, self.remote_hosts, affinity_enabled = (self.placement_strategy == "affinity"), affinity_load_tolerance = self.affinity_load_tolerance, tracer = cls._tracer, occupancy = occupancy, log_sample_rate = self.allocation_log_sample_rate)
 
         if cls._machine_manager_lock is None:
             cls._machine_manager_lock = Lock()
 
+        if cls._fleet_config_watcher is None and self.fleet_config_file:
+            cls._fleet_config_watcher = FleetConfigWatcher(self.log, cls._machine_manager, cls._machine_manager_lock, self.fleet_config_file, self.fleet_config_poll_interval)
+            try:
+                cls._fleet_config_watcher.reload()
+            except Exception as e:
+                self.log.info(f"Unable to load the fleet configuration from {self.fleet_config_file}, using remote_hosts: {e}")
+
+        if cls._idle_reclaimer is None:
+            cls._idle_reclaimer = IdleReclaimer(self.log, cls._machine_manager, cls._machine_manager_lock, self.idle_check_interval, self.idle_reclaim_dry_run)
+
+        if cls._poll_scheduler is None:
+            cls._poll_scheduler = PollScheduler(self.log, self.poll_min_interval, self.poll_max_interval, self.poll_stable_after, self.poll_jitter, self.poll_max_staleness, self.poll_host_rate_limit)
+
+        if cls._admission_controller is None:
+            cls._admission_controller = AdmissionController(self.log, self.spawn_user_rate, self.spawn_user_burst, self.spawn_type_rate, self.spawn_type_burst, self.max_launches_per_host)
+
+        if cls._package_cache_prewarmer is None and self.package_cache_path and self.package_cache_user and self.package_cache_packages:
+            cls._package_cache_prewarmer = PackageCachePrewarmer(self.log, self.package_cache_path, list(self.package_cache_packages), self.package_cache_user)
+
         # Initialize MinIOManager singleton if not already created.
         if (cls._minio_manager is None) and (self.minio_url):
-            cls._minio_manager = MinIOManager(self.minio_url, self.minio_access_key, self.minio_secret_key)
+            cls._minio_manager = MinIOManager(self.minio_url, self.minio_access_key, self.minio_secret_key, max_workers = self.minio_max_workers)
+            # Load the existing buckets in bulk right away if the hub's event loop is already running, rather than on the first spawn
+            try:
+                asyncio.get_running_loop()
+                cls._minio_manager.preload()
+            except RuntimeError:
+                pass
+
+        try:
+            asyncio.get_running_loop()
+            self.__ensure_background_tasks()
+        except RuntimeError:
+            pass
 
         #=== NORMAL INIT ===
         self.user_unique_identifier = self.user.name
@@ -59,124 +173,256 @@ class MLHubSpawner(Spawner):
         self.user_privilege_level = get_privilege(self.user.name)
 
         self.form_builder = JupyterFormBuilder()
-        self.notebook_manager = NotebookManager(self.log,"jupyterhub-singleuser --config=~/.jupyter/jupyter_notebook_config.py --ip 0.0.0.0", self.user_safe_username)
+        self.notebook_manager = NotebookManager(self.log,"jupyterhub-singleuser --config=~/.jupyter/jupyter_notebook_config.py --ip 0.0.0.0", self.user_safe_username, cls._tracer, self.launcher_directory, self.launcher_install_user)
 
         self.state_pid = 0
+        self.state_pgid = 0
         self.state_hostname = None
         self.state_notebook_port = None
 
         self.machine_offers = {}
 
-    #==== STARTING, STOPPPING, POLLING ====
-    def __slowError(self, errorMessage : str):
-        time.sleep(10) # Needed until https://github.com/jupyterhub/jupyterhub/pull/5020 is merged
-        raise JupyterHubHTMLException(errorMessage) 
-
-    async def start(self):
-        selected_machine_index = self.user_options['machineSelect']
-        shared_access_enabled = self.user_options['sharedAccess']
+        # Whether the next successful remote poll is the first one since launch (only used for tracing)
+        self.first_poll_pending = False
 
-        if self.user_unique_identifier not in self.machine_offers:
-            self.__slowError("Something didn't go well. Please go to the main page and try again.")
+        # Progress events of the current spawn, replayed to every progress() stream. progress_updated is set (and replaced) on every new event.
+        self.progress_events = []
+        self.progress_updated = asyncio.Event()
+        # Whether the notebook has been launched, after which its .jupyter.log is followed while someone is watching
+        self.progress_launched = False
+        self.progress_tail_lock = asyncio.Lock()
 
-        chosen_machine_type = self.machine_offers[self.user_unique_identifier][selected_machine_index]
-        is_privileged = (self.user_privilege_level >= 1)
-
-        if shared_access_enabled == False and is_privileged == False:
-            self.__slowError("Your account privilege does not allow for exclusive access to GPU machines.")
-        
-
-        #=== FIND MACHINE ===
-        self.__class__._machine_manager_lock.acquire()
+    #==== STARTING, STOPPPING, POLLING ====
+    def __ensure_background_tasks(self):
+        # Must be called from within the running event loop; cheap once the tasks are running
+        self.__class__._idle_reclaimer.ensure_started()
+        self.__class__._machine_manager.occupancy.ensure_started()
+        if self.__class__._fleet_config_watcher is not None:
+            self.__class__._fleet_config_watcher.ensure_started()
+        if self.__class__._package_cache_prewarmer is not None:
+            self.__class__._package_cache_prewarmer.ensure_started(self.__class__._machine_manager.get_hostnames())
+
+    def get_env(self):
+        env = super().get_env()
+        if self.package_cache_path:
+            env['MLHUB_PACKAGE_CACHE'] = self.package_cache_path
+        return env
+
+    async def __slowError(self, errorMessage : str):
+        self.__report_progress(None, errorMessage)
+        await asyncio.sleep(10) # Needed until https://github.com/jupyterhub/jupyterhub/pull/5020 is merged
+        raise JupyterHubHTMLException(errorMessage) 
 
-        found_machine_ip_port = self.__class__._machine_manager.find_machine(chosen_machine_type, shared_access_enabled)
+    def __releaseReservation(self):
+        with self.__class__._machine_manager_lock:
+            self.__class__._machine_manager.release_machine(self.user_unique_identifier)
 
-        if found_machine_ip_port == None:
-            self.__class__._machine_manager_lock.release()
-            self.__slowError("We're sorry, but there is no available machine that meets your current requirements.")
+    #==== PROGRESS ====
+    def __report_progress(self, progress, message : str):
+        event = {"message": message}
+        if progress is not None:
+            event["progress"] = progress
+        self.progress_events.append(event)
+        self.progress_updated.set()
+        self.progress_updated = asyncio.Event()
+
+    async def __tail_log_into_progress(self, max_lines : int = 100):
+        # Streams share the offset, so only one of them reads the log at a time; the others get the lines through progress_events
+        async with self.progress_tail_lock:
+            lines = await self.notebook_manager.tail_log()
+        if len(lines) > max_lines:
+            self.__report_progress(None, f"[.jupyter.log] ... {len(lines) - max_lines} lines skipped")
+            lines = lines[-max_lines:]
+        for line in lines:
+            self.__report_progress(None, f"[.jupyter.log] {line[:500]}")
+
+    async def progress(self):
+        """
+        Stream the phases of the current spawn (placement, bucket, warmup, launch attempts), followed by the notebook's
+        .jupyter.log while it starts up. JupyterHub stops iterating once the server is ready, or the spawn has failed.
+        """
+        index = 0
+        while True:
+            while index < len(self.progress_events):
+                yield self.progress_events[index]
+                index += 1
+            if self.progress_launched:
+                await self.__tail_log_into_progress()
+                if index < len(self.progress_events):
+                    continue
+            try:
+                await asyncio.wait_for(self.progress_updated.wait(), timeout=1)
+            except asyncio.TimeoutError:
+                pass
 
-        self.log.info(f"Found machine for {self.user_unique_identifier}: {chosen_machine_type.codename} at {found_machine_ip_port}.")
-        #=== RESERVE SPOT ===
-        if not self.__class__._machine_manager.take_machine(chosen_machine_type, found_machine_ip_port, self.user_unique_identifier, shared_access_enabled):
+    async def start(self):
+        self.progress_events = []
+        self.progress_launched = False
+        with self.__class__._tracer.span("MLHubSpawner.start", user=self.user_unique_identifier) as span:
+            selected_machine_index = self.user_options['machineSelect']
+            shared_access_enabled = self.user_options['sharedAccess']
+
+            if self.user_unique_identifier not in self.machine_offers:
+                await self.__slowError("Something didn't go well. Please go to the main page and try again.")
+
+            chosen_machine_type = self.machine_offers[self.user_unique_identifier][selected_machine_index]
+            is_privileged = (self.user_privilege_level >= 1)
+            span.set_attribute("codename", chosen_machine_type.codename)
+            span.set_attribute("shared", shared_access_enabled)
+
+            if shared_access_enabled == False and is_privileged == False:
+                await self.__slowError("Your account privilege does not allow for exclusive access to GPU machines.")
+
+            #=== ADMISSION CONTROL ===
+            rejection = self.__class__._admission_controller.admit(self.user_unique_identifier, chosen_machine_type.codename)
+            if rejection is not None:
+                span.set_attribute("rejected", rejection)
+                await self.__slowError(rejection)
+
+            #=== FIND MACHINE ===
+            self.__report_progress(10, f"Looking for an available {chosen_machine_type.codename} machine...")
+            with self.__class__._tracer.span("MLHubSpawner.lock_wait"):
+                self.__class__._machine_manager_lock.acquire()
+
+            # Hosts with too many launches in flight are skipped, so that the spot is never reserved on one of them
+            admission_controller = self.__class__._admission_controller
+            saturated_hostnames = admission_controller.saturated_hosts()
+            found_machine_ip_port = self.__class__._machine_manager.find_machine(chosen_machine_type, shared_access_enabled, self.user_unique_identifier, saturated_hostnames)
+
+            if found_machine_ip_port == None:
+                self.__class__._machine_manager_lock.release()
+                if not saturated_hostnames.isdisjoint(chosen_machine_type.hostnames):
+                    span.set_attribute("rejected", "host_launches")
+                    await self.__slowError(admission_controller.reject_host_launches(self.user_unique_identifier, chosen_machine_type.codename))
+                await self.__slowError("We're sorry, but there is no available machine that meets your current requirements.")
+
+            self.log.info(f"Found machine for {self.user_unique_identifier}: {chosen_machine_type.codename} at {found_machine_ip_port}.")
+            #=== RESERVE SPOT ===
+            if not self.__class__._machine_manager.take_machine(chosen_machine_type, found_machine_ip_port, self.user_unique_identifier, shared_access_enabled):
+                self.__class__._machine_manager_lock.release()
+                await self.__slowError("We're sorry, but we were unable to reserve you a spot on your desired machine.")
+
+            self.log.info(f"Reserved a spot for {self.user_unique_identifier} on {found_machine_ip_port}. Shared access: {shared_access_enabled}")
+
+            self.state_hostname = found_machine_ip_port
+            # Taken under the lock, together with the spot: the launch slot is held until the launch is over
+            admission_controller.acquire_launch(found_machine_ip_port)
             self.__class__._machine_manager_lock.release()
-            self.__slowError("We're sorry, but we were unable to reserve you a spot on your desired machine.")
-
-        self.log.info(f"Reserved a spot for {self.user_unique_identifier} on {found_machine_ip_port}. Shared access: {shared_access_enabled}")
+            span.set_attribute("host", found_machine_ip_port)
+            self.__report_progress(20, f"Reserved a spot on a {chosen_machine_type.codename} machine.")
 
-        self.state_hostname = found_machine_ip_port
-        self.__class__._machine_manager_lock.release()
-
-        #=== CREATE BUCKET ===
-        if self.minio_url:
             try:
-                auth_state = await self.user.get_auth_state()
+                #=== CREATE BUCKET ===
+                if self.minio_url:
+                    self.__report_progress(30, "Preparing your storage bucket...")
+                    try:
+                        auth_state = await self.user.get_auth_state()
                 
-                if not auth_state or 'user' not in auth_state:
-                    self.__slowError("Authentication state is missing. Did you log in via OAuth?")
-
-                # try Azure OID first
-                azure_id = auth_state['user'].get('oid')
-                if not azure_id:
-                    # fall back to a sanitized UID
-                    raw_uid = getattr(self, "user_unique_identifier", "") or ""
-                    azure_id = self.__class__._minio_manager.generate_fallback_oid(raw_uid)
-                    self.log.info(f"No Azure OID found; using fallback ID: {azure_id}")
-
-                # now create the bucket using either the real OID or our fallback
-                if not self.__class__._minio_manager.create(azure_id):
-                    self.__slowError(f"Bucket creation failed for user with ID: {azure_id}.")
+                        if not auth_state or 'user' not in auth_state:
+                            await self.__slowError("Authentication state is missing. Did you log in via OAuth?")
+
+                        # try Azure OID first
+                        azure_id = auth_state['user'].get('oid')
+                        if not azure_id:
+                            # fall back to a sanitized UID
+                            raw_uid = getattr(self, "user_unique_identifier", "") or ""
+                            azure_id = self.__class__._minio_manager.generate_fallback_oid(raw_uid)
+                            self.log.info(f"No Azure OID found; using fallback ID: {azure_id}")
+
+                        # now create the bucket using either the real OID or our fallback
+                        with self.__class__._tracer.span("MinIOManager.ensure_bucket", known=(azure_id in self.__class__._minio_manager.known_buckets)):
+                            bucket_ready = await self.__class__._minio_manager.ensure_bucket(azure_id)
+                        if not bucket_ready:
+                            await self.__slowError(f"Bucket creation failed for user with ID: {azure_id}.")
+                        else:
+                            self.log.info(f"Bucket successfully created (or already exists) for user with ID: {azure_id}.")
+                    except JupyterHubHTMLException:
+                        raise
+                    except Exception as error:
+                        await self.__slowError(f"Error during bucket creation: {error}")
                 else:
-                    self.log.info(f"Bucket successfully created (or already exists) for user with ID: {azure_id}.")
-            except Exception as error:
-                self.__slowError(f"Error during bucket creation: {error}")
-        else:
-            self.log.info("Minio URL not provided in config, skipping bucket creation")
+                    self.log.info("Minio URL not provided in config, skipping bucket creation")
 
 
-        #=== LAUNCH NOTEBOOK ===
-        split_hostname = found_machine_ip_port.split(":")
-        host_ip = split_hostname[0]
-        host_port = split_hostname[1] 
+                #=== LAUNCH NOTEBOOK ===
+                split_hostname = found_machine_ip_port.split(":")
+                host_ip = split_hostname[0]
+                host_port = split_hostname[1] 
 
-        (notebook_port, notebook_pid) = await self.notebook_manager.launch_notebook(self.get_env(), self.hub.api_url, host_ip, host_port)
+                (notebook_port, notebook_pid) = await self.notebook_manager.launch_notebook(self.get_env(), self.hub.api_url, host_ip, host_port, report = lambda message: self.__report_progress(50, message))
+            finally:
+                admission_controller.release_launch(found_machine_ip_port)
 
-        if notebook_port == None or notebook_pid == None:
-            self.__class__._machine_manager.release_machine(self.user_unique_identifier)
-            self.__slowError("We're sorry, we were unable to launch your notebook instance. Your reserved spot was therefore released.")
+            if notebook_port == None or notebook_pid == None:
+                self.__releaseReservation()
+                # Whatever the failed attempts wrote is the most useful diagnostic
+                await self.__tail_log_into_progress()
+                await self.notebook_manager.close_log_connection()
+                await self.__slowError("We're sorry, we were unable to launch your notebook instance. Your reserved spot was therefore released.")
+
+            self.log.info(f"Launched a notebook for {self.user_unique_identifier} on {found_machine_ip_port} with port {notebook_port} and PID {notebook_pid}")
 
-        self.log.info(f"Launched a notebook for {self.user_unique_identifier} on {found_machine_ip_port} with port {notebook_port} and PID {notebook_pid}")
+            self.state_notebook_port = notebook_port
+            self.state_pid = notebook_pid
+            self.state_pgid = self.notebook_manager.pgid
+            self.__class__._poll_scheduler.register(self.user_unique_identifier, found_machine_ip_port)
+            self.first_poll_pending = True
+            self.__class__._idle_reclaimer.register(self.user_unique_identifier, self)
+            self.__ensure_background_tasks()
 
-        self.state_notebook_port = notebook_port
-        self.state_pid = notebook_pid
+            self.__report_progress(70, "Notebook started, waiting for it to respond...")
+            self.progress_launched = True
 
-        return (host_ip, notebook_port)
+            return (host_ip, notebook_port)
 
 
     async def poll(self):
-        #=== NOT CONFIGURED ===
-        if not self.state_pid or self.state_pid == 0:
-            self.clear_state()
-            return 0
+        with self.__class__._tracer.span("MLHubSpawner.poll", user=self.user_unique_identifier) as span:
+            #=== NOT CONFIGURED ===
+            if not self.state_pid or self.state_pid == 0:
+                self.clear_state()
+                return 0
         
-        #=== NOTEBOOK DEAD ===
-        notebook_alive = await self.notebook_manager.check_notebook_alive()
-        if not notebook_alive:
-            return 0
-
-        #=== ALL GOOD ===
-        return None
+            # Restored notebooks are first seen here after a hub restart, within the event loop
+            self.__ensure_background_tasks()
+
+            # The log is only followed while the spawn is pending
+            if not self.pending:
+                await self.notebook_manager.close_log_connection()
+
+            #=== RECENTLY CHECKED ===
+            poll_scheduler = self.__class__._poll_scheduler
+            if not poll_scheduler.should_check(self.user_unique_identifier, self.state_hostname):
+                span.set_attribute("cached", True)
+                return None
+
+            #=== NOTEBOOK DEAD ===
+            notebook_alive = await self.notebook_manager.check_notebook_alive()
+            span.set_attribute("host", self.state_hostname)
+            if not poll_scheduler.record_result(self.user_unique_identifier, self.state_hostname, notebook_alive):
+                return 0
+
+            #=== ALL GOOD ===
+            if self.first_poll_pending:
+                span.set_attribute("first_success", True)
+                self.first_poll_pending = False
+            return None
 
     async def stop(self, now = False):
-        #=== KILL THE NOTEBOOK ===
-        await self.notebook_manager.kill_notebook()
-
-        #=== RELEASE THE SPOT ===
-        self.__class__._machine_manager_lock.acquire()
-        self.log.info(f"Releasing the machine of {self.user_unique_identifier}")
-        self.__class__._machine_manager.release_machine(self.user_unique_identifier)
-        self.__class__._machine_manager_lock.release()
+        with self.__class__._tracer.span("MLHubSpawner.stop", user=self.user_unique_identifier, now=now):
+            #=== KILL THE NOTEBOOK ===
+            await self.notebook_manager.close_log_connection()
+            await self.notebook_manager.kill_notebook(self.notebook_stop_grace_period)
+
+            #=== RELEASE THE SPOT ===
+            self.__class__._machine_manager_lock.acquire()
+            self.log.info(f"Releasing the machine of {self.user_unique_identifier}")
+            self.__class__._machine_manager.release_machine(self.user_unique_identifier)
+            self.__class__._machine_manager_lock.release()
 
-        self.clear_state()
+            self.__class__._poll_scheduler.forget(self.user_unique_identifier)
+            self.__class__._idle_reclaimer.unregister(self.user_unique_identifier)
+            self.clear_state()
 
     #==== STATE RESTORE ===
 
@@ -185,7 +431,8 @@ class MLHubSpawner(Spawner):
         super().load_state(state)
         spawner_load_state(self, state)
         # Load the state into the NotebookManager as well, now that we have it (if any)
-        self.notebook_manager.restore_state(self.state_pid, self.state_hostname, self.state_notebook_port)
+        if self.notebook_manager.restore_state(self.state_pid, self.state_hostname, self.state_notebook_port, self.state_pgid):
+            self.__class__._idle_reclaimer.register(self.user_unique_identifier, self)
 
     # Retrieve the current state of the spawner as a dictionary.
     def get_state(self):
@@ -193,7 +440,7 @@ class MLHubSpawner(Spawner):
         state.update(spawner_get_state(self))
         return state
 
-    # Clear the spawner state, resetting remote IP, PID, codename, and hostname.
+    # Clear the spawner state, resetting remote IP, PID, process group, codename, and hostname.
     def clear_state(self):
         super().clear_state()
         spawner_clear_state(self)
@@ -1,15 +1,54 @@
 import asyncssh
+import asyncio
+import base64
+import gzip
+import hashlib
+import os
 import random
+import re
+import shlex
+from typing import Callable, List, Optional
+from .tracing import Tracer
+
+# The launcher shipped with the spawner, and where it is installed (relative to the user's home) on every host,
+# unless a shared launcher directory is configured
+LAUNCHER_LOCAL_PATH = os.path.join(os.path.dirname(__file__), 'resources', 'launcher.sh')
+LAUNCHER_REMOTE_DIRECTORY = ".mlhub"
+LAUNCHER_REMOTE_PATH = f"{LAUNCHER_REMOTE_DIRECTORY}/launcher.sh"
+LAUNCHER_VERSION_PATTERN = re.compile(rb"^# mlhub-launcher-version: (\S+)$", re.MULTILINE)
+
+# Only variables with valid shell names can be exported by the launcher
+ENV_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
 
 class NotebookManager():
-    def __init__(self, logger, launch_command: str, safe_username: str):
+    # Hash and version of the local launcher, read once
+    _launcher_digest = None
+    _launcher_version = None
+
+    # (host, owner) pairs on which the installed launcher was found to match the local one, shared by all managers.
+    # The owner is the launcher_install_user for the shared copy, and the user for a per-user copy.
+    _verified_launchers = set()
+
+    def __init__(self, logger, launch_command: str, safe_username: str, tracer: Tracer = None, launcher_directory: str = "", launcher_install_user: str = ""):
         self.notebook_launch_command = launch_command
         self.log = logger
+        # If both are set, the launcher is installed once per host into launcher_directory, over a connection as
+        # launcher_install_user. Otherwise every user gets their own copy, in ~/.mlhub.
+        self.launcher_directory = launcher_directory.rstrip("/")
+        self.launcher_install_user = launcher_install_user
+        # Tracing is disabled unless a configured tracer is handed in
+        self.tracer = tracer if tracer is not None else Tracer()
         # These will be set upon a successful launch.
         self.pid = None
+        self.pgid = None
         self.port = None
         self.remote_ip = None
         self.host_port = None
+        # Offset of the first unread byte of .jupyter.log, and the connection kept open to follow it during startup.
+        # Once closed (see close_log_connection), the connection is not reopened until the next mark_log_position.
+        self.log_offset = 0
+        self.log_connection = None
+        self.log_closed = False
         # The safe username is static, unique to this instance of the manager, and never changes. It's therefore safe to set it here, and just re-use it everywhere.
         self.safe_username = safe_username
 
@@ -20,21 +59,138 @@ class NotebookManager():
         The result is intentionally ignored.
         """
         self.log.info(f"Performing warmup connection to {host_ip}:{host_port} with user {self.safe_username}.")
-        try:
-            async with asyncssh.connect(
-                host_ip,
-                port=host_port,
-                username=self.safe_username,
-                password="password",  # hardcoded password for warmup
-                known_hosts=None,
-                connect_timeout=10
-            ) as conn:
-                # Run a simple echo command; the result is not used.
-                await conn.run("echo warmup", check=False)
-        except Exception as e:
-            self.log.info(f"Warmup connection encountered an exception (expected if user is new): {e}")
+        with self.tracer.span("NotebookManager.warmup", host=f"{host_ip}:{host_port}"):
+            try:
+                async with asyncssh.connect(
+                    host_ip,
+                    port=host_port,
+                    username=self.safe_username,
+                    password="password",  # hardcoded password for warmup
+                    known_hosts=None,
+                    connect_timeout=10
+                ) as conn:
+                    # Run a simple echo command; the result is not used.
+                    await conn.run("echo warmup", check=False)
+            except Exception as e:
+                self.log.info(f"Warmup connection encountered an exception (expected if user is new): {e}")
+
+    @classmethod
+    def _load_launcher_metadata(cls):
+        if cls._launcher_digest is None:
+            with open(LAUNCHER_LOCAL_PATH, "rb") as file:
+                content = file.read()
+            match = LAUNCHER_VERSION_PATTERN.search(content)
+            cls._launcher_version = match.group(1).decode("ascii") if match else "unknown"
+            cls._launcher_digest = hashlib.sha256(content).hexdigest()
+
+    @classmethod
+    def _get_launcher_digest(cls) -> str:
+        cls._load_launcher_metadata()
+        return cls._launcher_digest
+
+    @classmethod
+    def get_launcher_version(cls) -> str:
+        """
+        Return the version declared by the local launcher (its "mlhub-launcher-version" line).
+        """
+        cls._load_launcher_metadata()
+        return cls._launcher_version
+
+    def _is_launcher_shared(self) -> bool:
+        return bool(self.launcher_directory and self.launcher_install_user)
+
+    def get_launcher_remote_path(self) -> str:
+        """
+        Where the launcher is installed on the hosts. The shared copy is named after its version and hash, so an installed
+        file never changes, and different versions can coexist while hubs are upgraded.
+        """
+        if self._is_launcher_shared():
+            return f"{self.launcher_directory}/launcher-{self.get_launcher_version()}-{self._get_launcher_digest()[:12]}.sh"
+        return LAUNCHER_REMOTE_PATH
+
+    async def ensure_launcher(self, conn, host: str):
+        """
+        Make sure the launcher on the host matches the local one, uploading it over SFTP if it does not.
+        conn is the user's connection, over which a per-user copy is checked and installed. The shared copy
+        is checked and installed over a separate connection as launcher_install_user (see _ensure_shared_launcher).
+        Once verified, a host is not checked again, so launches normally cost no extra round trip.
+        """
+        if self._is_launcher_shared():
+            await self._ensure_shared_launcher(host)
+            return
+
+        key = (host, self.safe_username)
+        if key in NotebookManager._verified_launchers:
+            return
+
+        digest = self._get_launcher_digest()
+        result = await conn.run(f"sha256sum {LAUNCHER_REMOTE_PATH} 2>/dev/null", check=False)
+        remote_digest = result.stdout.split()[0] if result.exit_status == 0 and result.stdout else None
 
-    async def launch_notebook(self, jupyter_env: dict, hub_api_url: str, host_ip: str, host_port: str):
+        if remote_digest != digest:
+            self.log.info(f"Installing launcher version {self.get_launcher_version()} for {self.safe_username} on {host} (installed: {remote_digest}, expected: {digest}).")
+            await self._upload_launcher(conn, LAUNCHER_REMOTE_DIRECTORY, LAUNCHER_REMOTE_PATH)
+
+        NotebookManager._verified_launchers.add(key)
+
+    async def _ensure_shared_launcher(self, host: str):
+        """
+        Install the launcher into launcher_directory on the host, unless it is already there. Its name carries its hash
+        (see get_launcher_remote_path), so checking that the file exists is enough.
+        """
+        key = (host, self.launcher_install_user)
+        if key in NotebookManager._verified_launchers:
+            return
+
+        remote_path = self.get_launcher_remote_path()
+        host_ip, host_port = host.split(":")
+        async with asyncssh.connect(
+            host_ip,
+            port=int(host_port),
+            username=self.launcher_install_user,
+            client_keys=["~/.ssh/id_rsa"],
+            known_hosts=None,
+            connect_timeout=10
+        ) as conn:
+            result = await conn.run(f"test -f {shlex.quote(remote_path)}", check=False)
+            if result.exit_status != 0:
+                self.log.info(f"Installing launcher version {self.get_launcher_version()} on {host} as {remote_path}.")
+                await self._upload_launcher(conn, self.launcher_directory, remote_path)
+
+        NotebookManager._verified_launchers.add(key)
+
+    async def _upload_launcher(self, conn, remote_directory: str, remote_path: str):
+        async with conn.start_sftp_client() as sftp:
+            await sftp.makedirs(remote_directory, exist_ok=True)
+            # Upload next to the target and rename, so a launch never runs a partially written launcher.
+            # Concurrent installs on the same host each use their own temporary file.
+            temporary_path = f"{remote_path}.{os.getpid()}.{random.getrandbits(32):08x}.tmp"
+            await sftp.put(LAUNCHER_LOCAL_PATH, temporary_path)
+            # Every user runs the shared copy
+            await sftp.chmod(temporary_path, 0o644)
+            await sftp.posix_rename(temporary_path, remote_path)
+
+    def _serialize_environment(self, environment: dict) -> str:
+        """
+        Serialize the environment for the launcher: NUL-separated KEY=VALUE entries, gzipped and base64-encoded.
+        Variables that cannot be exported (invalid names, NUL bytes) are left out.
+        """
+        entries = []
+        for key, value in environment.items():
+            value = str(value)
+            if not ENV_NAME_PATTERN.match(key) or "\0" in value:
+                self.log.info(f"Not passing environment variable {key!r} to the notebook: it cannot be exported.")
+                continue
+            entries.append(f"{key}={value}\0")
+        return base64.b64encode(gzip.compress("".join(entries).encode("utf-8"))).decode("ascii")
+
+    async def launch_notebook(self, jupyter_env: dict, hub_api_url: str, host_ip: str, host_port: str, report: Optional[Callable[[str], None]] = None):
+        """
+        Launch the notebook on the given host, retrying on a new random port up to 3 times.
+        If given, report is called with a short, user-facing message as each phase of the launch begins.
+        Returns (port, pid), or (None, None) if every attempt failed.
+        """
+        report = report if report is not None else (lambda message: None)
 
         notebook_jupyter_env = jupyter_env
         notebook_jupyter_env['JUPYTERHUB_API_URL'] = hub_api_url
@@ -47,57 +203,60 @@ class NotebookManager():
         self.host_port = int(host_port)
 
         # Perform a preliminary warmup connection.
+        report("Preparing your account on the machine...")
         await self.warmup_connection(host_ip, self.host_port, ssh_key_path)
 
+        # Only what this launch writes to .jupyter.log is of interest
+        await self.mark_log_position()
+
+        # The environment is the same for every attempt, so it is only serialized once
+        environment_blob = self._serialize_environment(notebook_jupyter_env)
+        host = f"{host_ip}:{host_port}"
+
         for attempt in range(max_attempts):
             random_port = random.randint(2000, 65535)
             self.log.info(f"Attempt {attempt+1}: Launching notebook on random port {random_port}.")
+            report(f"Starting your notebook (attempt {attempt+1} of {max_attempts})...")
 
-            # Build the bash script.
-            bash_script_lines = ["#!/bin/bash"]
-            for key, value in notebook_jupyter_env.items():
-                bash_script_lines.append(f"export {key}='{value}'")
-            bash_script_lines += [
-                "unset XDG_RUNTIME_DIR",
-                "touch .jupyter.log",
-                "chmod 600 .jupyter.log",
-                "run=true source initialSetup.sh >> .jupyter.log",
-                f"{self.notebook_launch_command} --port {random_port} < /dev/null >> .jupyter.log 2>&1 & pid=$!",
-                "echo $pid"
-            ]
-            bash_script_content = "\n".join(bash_script_lines)
+            # The command line is still expanded by the user's login shell (e.g. the ~ in the launch command)
+            launch_command = f"bash {shlex.quote(self.get_launcher_remote_path())} {random_port} {self.notebook_launch_command}"
 
-            try:
-                async with asyncssh.connect(
-                    host_ip,
-                    port=self.host_port,
-                    username=self.safe_username,
-                    client_keys=[ssh_key_path],
-                    known_hosts=None,
-                    connect_timeout=10
-                ) as conn:
-                    # Execute the constructed bash script.
-                    result = await conn.run("bash -s", input=bash_script_content)
-
-                stdout = result.stdout.strip() if result.stdout else ""
-                stderr = result.stderr.strip() if result.stderr else ""
-                return_code = result.exit_status
-
-                if return_code == 0 and stdout:
-                    try:
-                        pid = int(stdout)
-                        # Save the process ID and port for later operations.
-                        self.pid = pid
-                        self.port = random_port
-                        self.log.info(f"Notebook launched successfully on port {random_port} with PID {pid}.")
-                        return (random_port, pid)
-                    except ValueError:
-                        self.log.info(f"Attempt {attempt+1}: Unexpected output format '{stdout}'. Retrying with a new port...")
-                else:
-                    self.log.info(f"Attempt {attempt+1}: Error launching notebook on port {random_port}: "
-                                  f"{stderr if stderr else 'No output'}. Retrying...")
-            except Exception as e:
-                self.log.info(f"Attempt {attempt+1}: Exception occurred: {e}. Retrying...")
+            with self.tracer.span("NotebookManager.launch_attempt", host=f"{host_ip}:{host_port}", attempt=attempt + 1, port=random_port):
+                try:
+                    async with asyncssh.connect(
+                        host_ip,
+                        port=self.host_port,
+                        username=self.safe_username,
+                        client_keys=[ssh_key_path],
+                        known_hosts=None,
+                        connect_timeout=10
+                    ) as conn:
+                        await self.ensure_launcher(conn, host)
+                        result = await conn.run(launch_command, input=environment_blob)
+
+                    stdout = result.stdout.strip() if result.stdout else ""
+                    stderr = result.stderr.strip() if result.stderr else ""
+                    return_code = result.exit_status
+
+                    if return_code == 0 and stdout:
+                        try:
+                            pid = int(stdout)
+                            # Save the process ID and port for later operations.
+                            self.pid = pid
+                            self.pgid = pid
+                            self.port = random_port
+                            self.log.info(f"Notebook launched successfully on port {random_port} with PID {pid} (process group {pid}).")
+                            return (random_port, pid)
+                        except ValueError:
+                            self.log.info(f"Attempt {attempt+1}: Unexpected output format '{stdout}'. Retrying with a new port...")
+                    else:
+                        self.log.info(f"Attempt {attempt+1}: Error launching notebook on port {random_port}: "
+                                      f"{stderr if stderr else 'No output'}. Retrying...")
+                except Exception as e:
+                    self.log.info(f"Attempt {attempt+1}: Exception occurred: {e}. Retrying...")
+
+            # The launcher may have been removed or changed on the host, so check it again on the next attempt
+            NotebookManager._verified_launchers.discard((host, self.launcher_install_user if self._is_launcher_shared() else self.safe_username))
 
         # If all attempts fail, return (None, None)
         self.log.info("All attempts to launch the notebook failed.")
@@ -106,6 +265,7 @@ class NotebookManager():
     async def check_notebook_alive(self):
         """
         Check if the notebook process is running on the remote host by sending signal 0.
+        Returns True (alive), False (dead), or None if the check itself could not be carried out (e.g. SSH failure).
         """
         if not self.pid:
             self.log.info("No PID available to check. Notebook is not running.")
@@ -114,77 +274,241 @@ class NotebookManager():
         ssh_key_path = "~/.ssh/id_rsa"
 
         command = f"kill -s 0 {self.pid} < /dev/null"
+        with self.tracer.span("NotebookManager.check_notebook_alive", host=f"{self.remote_ip}:{self.host_port}"):
+            try:
+                async with asyncssh.connect(
+                    self.remote_ip,
+                    port=self.host_port,
+                    username=self.safe_username,
+                    client_keys=[ssh_key_path],
+                    known_hosts=None,
+                    connect_timeout=10
+                ) as conn:
+                    result = await conn.run(command)
+                alive = (result.exit_status == 0)
+                self.log.info(f"Check notebook alive: PID {self.pid} is {'alive' if alive else 'dead'} (exit status {result.exit_status}).")
+                return alive
+            except Exception as e:
+                self.log.info(f"Error checking notebook alive: {e}")
+                return None
+
+    async def sample_utilization(self, sample_seconds: int = 2):
+        """
+        Sample the remote resource usage over sample_seconds, in a single SSH round trip.
+        Returns (cpu, gpu): the CPU usage of all processes of safe_username, in percent of one core, and the average
+        utilization of the host's GPUs, in percent (None if the host has no usable nvidia-smi).
+        Returns None if the sample could not be taken.
+        """
+        if not self.remote_ip:
+            return None
+
+        ssh_key_path = "~/.ssh/id_rsa"
+        # Kernels run in their own sessions, so the CPU usage is measured over all processes of the user rather than the notebook's process group.
+        # Fields 14 and 15 of /proc/<pid>/stat are utime and stime; the command name (field 2) is stripped first, since it may contain spaces.
+        command = "\n".join([
+            "cpu_ticks() { for p in $(pgrep -u \"$(id -u)\"); do sed 's/.*) //' /proc/$p/stat 2>/dev/null; done | awk '{ s += $12 + $13 } END { print s + 0 }'; }",
+            "before=$(cpu_ticks)",
+            f"sleep {sample_seconds}",
+            "after=$(cpu_ticks)",
+            "gpu=$(nvidia-smi --query-gpu=utilization.gpu --format=csv,noheader,nounits 2>/dev/null | awk '{ s += $1; n++ } END { if (n) print s / n }')",
+            f"echo \"$(( (after - before) * 100 / ({sample_seconds} * $(getconf CLK_TCK)) )) ${{gpu:-none}}\"",
+        ])
+
         try:
-            async with asyncssh.connect(
-                self.remote_ip,
-                port=self.host_port,
-                username=self.safe_username,
-                client_keys=[ssh_key_path],
-                known_hosts=None,
-                connect_timeout=10
-            ) as conn:
-                result = await conn.run(command)
-            alive = (result.exit_status == 0)
-            self.log.info(f"Check notebook alive: PID {self.pid} is {'alive' if alive else 'dead'} (exit status {result.exit_status}).")
-            return alive
+            with self.tracer.span("NotebookManager.sample_utilization", host=f"{self.remote_ip}:{self.host_port}"):
+                async with asyncssh.connect(
+                    self.remote_ip,
+                    port=self.host_port,
+                    username=self.safe_username,
+                    client_keys=[ssh_key_path],
+                    known_hosts=None,
+                    connect_timeout=10
+                ) as conn:
+                    result = await conn.run("bash -s", input=command, check=False)
+            cpu_text, gpu_text = result.stdout.split()
+            return (float(cpu_text), None if gpu_text == "none" else float(gpu_text))
         except Exception as e:
-            self.log.info(f"Error checking notebook alive: {e}")
-            return False
+            self.log.info(f"Unable to sample the utilization of '{self.safe_username}' on {self.remote_ip}: {e!r}")
+            return None
 
-    async def kill_notebook(self):
+    async def kill_notebook(self, grace_period: int = 10):
         """
-        Kill all processes belonging to the safe_username on the remote host using SIGKILL.
+        Stop the notebook on the remote host in a single round trip: its process group, and every descendant of it.
+        jupyter_client starts kernels in their own sessions, so they are outside the group and are tracked through
+        their parent PIDs instead; a process stays tracked once seen, even after it has been reparented.
+        Everything is sent SIGTERM first, and SIGKILL if anything is still alive after grace_period seconds.
+        The remote command reports the outcome itself, since the SSH session is not part of the tree.
+        States saved before process groups were tracked only have a PID, in which case that process and its descendants are signalled.
         """
+        if not self.pgid and not self.pid:
+            self.log.info(f"No process group or PID available for '{self.safe_username}'. Nothing to kill.")
+            return False
+
         ssh_key_path = "~/.ssh/id_rsa"
-        command = f"pkill -9 -u {self.safe_username} < /dev/null"
+        target = f"-{self.pgid}" if self.pgid else f"{self.pid}"
+        command = "\n".join([
+            f"target={target}",
+            # tree prints the live members of the group (or the PID), their descendants, and every process tracked so far.
+            # Zombies are dead for our purposes, but still answer to kill -0 until they are reaped.
+            "pids=",
+            "tree() { ps -u \"$(id -u)\" -o pid=,ppid=,pgid=,stat= | awk -v t=\"$target\" -v known=\"$pids\" '"
+            "BEGIN { n = split(known, k, \" \"); for (i = 1; i <= n; i++) mark[k[i]] = 1 } "
+            "$4 !~ /^Z/ { parent[$1] = $2; if ($3 == -t || $1 == t) mark[$1] = 1 } "
+            "END { do { changed = 0; for (c in parent) if (!(c in mark) && (parent[c] in mark)) { mark[c] = 1; changed = 1 } } while (changed); "
+            "for (c in parent) if (c in mark) printf \"%s \", c }'; }",
+            "alive() { pids=\"$(tree)\"; [ -n \"$pids\" ]; }",
+            "alive || exit 3",
+            "kill -TERM -- $target $pids 2>/dev/null",
+            f"for i in $(seq {grace_period * 10}); do",
+            "    alive || exit 0",
+            "    sleep 0.1",
+            "done",
+            "kill -KILL -- $target $pids 2>/dev/null",
+            "for i in $(seq 10); do",
+            "    alive || exit 2",
+            "    sleep 0.1",
+            "done",
+            "exit 1",
+        ])
 
         try:
-            async with asyncssh.connect(
-                self.remote_ip,
-                port=self.host_port,
-                username=self.safe_username,
-                client_keys=[ssh_key_path],
-                known_hosts=None,
-                connect_timeout=10
-            ) as conn:
-                # Don't raise on non-zero; inspect exit_status & exit_signal ourselves
-                result = await conn.run(command, check=False)
-
-            status   = result.exit_status
-            sig_info = result.exit_signal
-
-            # Success if:
-            #  - killed ≥1 process (status == 0)
-            #  - pkill killed the SSH child so we get no status (status is None)
-            #  - old AsyncSSH pattern: status == -1 and exit_signal set
-            if status == 0 or status is None or (status == -1 and sig_info):
-                self.log.info(f"All processes for user '{self.safe_username}' were killed successfully.")
-                self.pid = None
-                return True
-
-            # No matching processes
-            if status == 1:
-                self.log.info(f"No processes found for user '{self.safe_username}'. Nothing to kill.")
-                return False
-
-            # Anything else is unexpected (should no longer fire on your “None” case)
-            self.log.info(
-                f"Unexpected result killing processes for '{self.safe_username}': exit_status={status!r}, exit_signal={sig_info!r}"
-            )
+            # Bound the whole stop, so that a stuck host cannot hold up the hub: connect, grace period and the SIGKILL confirmation
+            with self.tracer.span("NotebookManager.kill_notebook", host=f"{self.remote_ip}:{self.host_port}", target=target):
+                result = await asyncio.wait_for(self._run_kill_command(ssh_key_path, command), timeout=grace_period + 16)
+        except Exception as e:
+            self.log.info(f"Exception while trying to stop the notebook of '{self.safe_username}' (target {target}): {e!r}")
             return False
 
-        except Exception as e:
-            self.log.info(f"Exception while trying to kill processes for '{self.safe_username}': {e}")
+        status = result.exit_status
+        if status == 0:
+            self.log.info(f"Notebook of '{self.safe_username}' (target {target}) terminated gracefully.")
+        elif status == 2:
+            self.log.info(f"Notebook of '{self.safe_username}' (target {target}) did not exit within {grace_period}s and was killed.")
+        elif status == 3:
+            self.log.info(f"No processes found for '{self.safe_username}' (target {target}). Nothing to kill.")
+            self.pid = None
+            self.pgid = None
+            return False
+        else:
+            self.log.info(f"Unable to stop the notebook of '{self.safe_username}' (target {target}): exit_status={status!r}, stderr={result.stderr!r}")
             return False
 
+        self.pid = None
+        self.pgid = None
+        return True
+
+    async def _run_kill_command(self, ssh_key_path: str, command: str):
+        async with asyncssh.connect(
+            self.remote_ip,
+            port=self.host_port,
+            username=self.safe_username,
+            client_keys=[ssh_key_path],
+            known_hosts=None,
+            connect_timeout=10
+        ) as conn:
+            # Don't raise on non-zero; the exit status encodes the outcome
+            return await conn.run("bash -s", input=command, check=False)
+
+    #==== LOG TAIL ====
 
+    async def _run_on_log_connection(self, command: str):
+        """
+        Run a command over the persistent log connection, opening it if needed, and reconnecting once if it was dropped.
+        Output is returned as bytes. Raises ConnectionError once the connection was closed with close_log_connection.
+        """
+        for attempt in range(2):
+            if self.log_closed:
+                raise ConnectionError("The log connection was closed")
+            if self.log_connection is None:
+                connection = await asyncssh.connect(
+                    self.remote_ip,
+                    port=self.host_port,
+                    username=self.safe_username,
+                    client_keys=["~/.ssh/id_rsa"],
+                    known_hosts=None,
+                    connect_timeout=10
+                )
+                # close_log_connection may have run while connecting, in which case nobody would close this one
+                if self.log_closed:
+                    connection.close()
+                    raise ConnectionError("The log connection was closed")
+                self.log_connection = connection
+            try:
+                return await self.log_connection.run(command, check=False, encoding=None)
+            except (asyncssh.Error, OSError):
+                await self._drop_log_connection()
+                if attempt == 1:
+                    raise
 
+    async def mark_log_position(self):
+        """
+        Skip everything currently in .jupyter.log, so that tail_log only returns what is written from now on.
+        This (re)opens the log connection, even after close_log_connection.
+        """
+        self.log_closed = False
+        try:
+            result = await self._run_on_log_connection("stat -c %s .jupyter.log 2>/dev/null || echo 0")
+            self.log_offset = int(result.stdout.strip() or 0)
+        except Exception as e:
+            self.log.info(f"Unable to find the end of .jupyter.log for '{self.safe_username}': {e!r}")
+            self.log_offset = 0
+
+    async def tail_log(self, max_bytes: int = 65536) -> List[str]:
+        """
+        Return the complete lines appended to .jupyter.log since the last call (at most max_bytes at a time),
+        reading only the new bytes, over the persistent log connection. Returns an empty list on errors.
+        If the log was truncated in the meantime, it is read again from the start.
+        """
+        if not self.remote_ip or self.log_closed:
+            return []
+
+        command = "; ".join([
+            "size=$(stat -c %s .jupyter.log 2>/dev/null || echo 0)",
+            f"start={self.log_offset}",
+            "if [ \"$size\" -lt \"$start\" ]; then start=0; fi",
+            "echo \"$start\"",
+            f"tail -c +$((start + 1)) .jupyter.log 2>/dev/null | head -c {max_bytes}"
+        ])
+        try:
+            with self.tracer.span("NotebookManager.tail_log", host=f"{self.remote_ip}:{self.host_port}"):
+                result = await self._run_on_log_connection(command)
+            header, _, data = result.stdout.partition(b"\n")
+            start = int(header)
+        except Exception as e:
+            self.log.info(f"Unable to read .jupyter.log of '{self.safe_username}': {e!r}")
+            return []
+
+        # Leave a partially written last line for the next call, unless a single line fills the whole chunk
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            if len(data) < max_bytes:
+                return []
+            end = len(data)
+        self.log_offset = start + end
+        return data[:end].decode("utf-8", errors="replace").splitlines()
+
+    async def close_log_connection(self):
+        """
+        Close the log connection, and keep it closed: later tail_log calls return nothing until mark_log_position.
+        """
+        self.log_closed = True
+        await self._drop_log_connection()
+
+    async def _drop_log_connection(self):
+        connection, self.log_connection = self.log_connection, None
+        if connection is not None:
+            connection.close()
+            try:
+                await connection.wait_closed()
+            except Exception:
+                pass
 
-    def restore_state(self, pid: int, hostname: str, notebook_port: int):
+    def restore_state(self, pid: int, hostname: str, notebook_port: int, pgid: int = None):
         """
         Restore the last‐saved notebook process info so that future
         alive/poll/kill calls will work after a hub restart.
         - pid: the remote process ID
+        - pgid: the remote process group ID (missing for states saved by older versions)
         - hostname: "ip:ssh_port" string you saved in spawner.state_hostname
         - notebook_port: the port the notebook is listening on
         """
@@ -203,11 +527,12 @@ class NotebookManager():
 
         # Stash them for later
         self.pid        = pid
+        self.pgid       = pgid
         self.port       = notebook_port
         self.remote_ip  = ip
         self.host_port  = ssh_port
 
         # One-line info log, however long it gets
-        self.log.info(f"Successfully restored notebook state: PID={self.pid}, notebook_port={self.port}, remote_ip={self.remote_ip}, ssh_port={self.host_port}")
+        self.log.info(f"Successfully restored notebook state: PID={self.pid}, PGID={self.pgid}, notebook_port={self.port}, remote_ip={self.remote_ip}, ssh_port={self.host_port}")
         return True
 
@@ -0,0 +1,237 @@
+import asyncio
+import atexit
+import json
+import os
+import sys
+import time
+from array import array
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple
+
+# Fields stored for every time slot of a series. All of them are peaks within the slot.
+FIELDS = ("total", "shared", "exclusive", "busy")
+
+class OccupancySeries:
+    def __init__(self, capacity: int):
+        """
+        Fixed-size ring of time slots, each holding the peak of every field in FIELDS.
+        Stored as a single unsigned short array, so a series costs capacity * len(FIELDS) * 2 bytes, however long it is recorded.
+        """
+        self.capacity = capacity
+        self.slots = array('H', bytes(2 * capacity * len(FIELDS)))
+        # Current value of every field, carried forward into slots without any changes
+        self.current = [0] * len(FIELDS)
+        # Absolute indexes (time // resolution) of the first and the most recently written slot, or None if nothing was written yet
+        self.first_slot = None
+        self.last_slot = None
+
+    def advance(self, slot: int):
+        """
+        Move the ring forward to the given absolute slot, filling the skipped slots with the current values.
+        """
+        if self.last_slot is not None and slot <= self.last_slot:
+            return
+        if self.first_slot is None:
+            self.first_slot = slot
+        first = slot if self.last_slot is None else max(self.last_slot + 1, slot - self.capacity + 1)
+        for absolute in range(first, slot + 1):
+            offset = (absolute % self.capacity) * len(FIELDS)
+            self.slots[offset:offset + len(FIELDS)] = array('H', self.current)
+        self.last_slot = slot
+
+    def set(self, slot: int, values):
+        self.advance(slot)
+        offset = (slot % self.capacity) * len(FIELDS)
+        for index, value in enumerate(values):
+            self.current[index] = value
+            if value > self.slots[offset + index]:
+                self.slots[offset + index] = value
+
+    def read(self, slot: int) -> Optional[Tuple[int, ...]]:
+        """
+        Return the peaks of the given absolute slot, or None if it was never recorded or has already been overwritten.
+        """
+        if self.last_slot is None or slot < self.first_slot or slot > self.last_slot or slot <= self.last_slot - self.capacity:
+            return None
+        offset = (slot % self.capacity) * len(FIELDS)
+        return tuple(self.slots[offset:offset + len(FIELDS)])
+
+class OccupancyRecorder:
+    def __init__(self, upstream_logger, resolution: int = 60, capacity: int = 10080, snapshot_path: str = "", snapshot_interval: int = 300):
+        """
+        Record the occupancy of every host and every machine type over time, at a fixed resolution (seconds per slot),
+        keeping the last `capacity` slots. The defaults keep a week of history at one-minute resolution.
+
+        For each host and each machine type, the peak number of allocations (total, shared and exclusive) and the peak
+        number of busy hosts (hosts with at least one allocation) are recorded per slot.
+
+        If snapshot_path is set, the history is loaded from it at startup, written back to it every snapshot_interval
+        seconds from a background task (see ensure_started), and once more when the hub exits.
+        """
+        self.upstream_logger = upstream_logger
+        self.resolution = resolution
+        self.capacity = capacity
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self._task = None
+        # Maps hostname -> OccupancySeries
+        self.hosts: Dict[str, OccupancySeries] = {}
+        # Maps codename -> OccupancySeries
+        self.types: Dict[str, OccupancySeries] = {}
+        # Updates happen under the allocation lock, but queries and snapshots do not
+        self.lock = Lock()
+
+        if self.snapshot_path:
+            if os.path.exists(self.snapshot_path):
+                self.load_snapshot()
+            atexit.register(self.save_snapshot)
+
+    def _series(self, group: Dict[str, OccupancySeries], key: str) -> OccupancySeries:
+        series = group.get(key)
+        if series is None:
+            series = OccupancySeries(self.capacity)
+            group[key] = series
+        return series
+
+    def record_change(self, hostname: str, codename: str, shared: bool, delta: int):
+        """
+        Record that an allocation was added (delta = 1) or removed (delta = -1) on the given host of the given type.
+        """
+        with self.lock:
+            slot = int(time.time()) // self.resolution
+            host_series = self._series(self.hosts, hostname)
+            type_series = self._series(self.types, codename)
+
+            host_total, host_shared, host_exclusive, host_busy = host_series.current
+            if shared:
+                host_shared += delta
+            else:
+                host_exclusive += delta
+            host_total += delta
+            new_host_busy = 1 if host_total > 0 else 0
+
+            type_total, type_shared, type_exclusive, type_busy = type_series.current
+            type_values = (
+                type_total + delta,
+                type_shared + (delta if shared else 0),
+                type_exclusive + (0 if shared else delta),
+                type_busy + (new_host_busy - host_busy)
+            )
+
+            host_series.set(slot, (host_total, host_shared, host_exclusive, new_host_busy))
+            type_series.set(slot, type_values)
+
+    def utilization(self, window: int, step: int) -> Dict[str, Any]:
+        """
+        Aggregate the last `window` seconds into buckets of `step` seconds (rounded to whole slots).
+        For every host and machine type, each field gets a list with the peak per bucket, plus "mean" with the
+        average total allocations per bucket. Buckets without any recorded history are reported as None.
+        """
+        slots_per_step = max(1, step // self.resolution)
+        slot_count = min(self.capacity, max(1, window // self.resolution))
+        step_count = -(-slot_count // slots_per_step)
+
+        with self.lock:
+            now_slot = int(time.time()) // self.resolution
+            first_slot = now_slot - step_count * slots_per_step + 1
+
+            def aggregate(series: OccupancySeries) -> Dict[str, list]:
+                series.advance(now_slot)
+                result = {name: [] for name in FIELDS}
+                result["mean"] = []
+                for bucket in range(step_count):
+                    start = first_slot + bucket * slots_per_step
+                    values = [series.read(slot) for slot in range(start, start + slots_per_step)]
+                    values = [value for value in values if value is not None]
+                    for index, name in enumerate(FIELDS):
+                        result[name].append(max(value[index] for value in values) if values else None)
+                    result["mean"].append(sum(value[0] for value in values) / len(values) if values else None)
+                return result
+
+            return {
+                "resolution": self.resolution,
+                "step": slots_per_step * self.resolution,
+                "start": first_slot * self.resolution,
+                "hosts": {hostname: aggregate(series) for hostname, series in self.hosts.items()},
+                "types": {codename: aggregate(series) for codename, series in self.types.items()}
+            }
+
+    #==== SNAPSHOTS ====
+    # A snapshot is a JSON header line describing every series, followed by the raw slots of each series, in header order.
+
+    def ensure_started(self):
+        """
+        Start writing periodic snapshots, if configured and not already running. Must be called from within the running event loop.
+        """
+        if self.snapshot_path and self.snapshot_interval > 0 and self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            # Copying the slots is cheap, but the file is written off the event loop
+            await loop.run_in_executor(None, self.save_snapshot)
+
+    def save_snapshot(self):
+        with self.lock:
+            header = {
+                "resolution": self.resolution,
+                "capacity": self.capacity,
+                "byteorder": sys.byteorder,
+                "series": []
+            }
+            blobs = []
+            for group_name, group in (("hosts", self.hosts), ("types", self.types)):
+                for key, series in group.items():
+                    header["series"].append({"group": group_name, "key": key, "first_slot": series.first_slot, "last_slot": series.last_slot})
+                    blobs.append(series.slots.tobytes())
+
+        # Write to a temporary file first, so that a crash never leaves a truncated snapshot behind
+        temporary_path = f"{self.snapshot_path}.tmp"
+        try:
+            with open(temporary_path, "wb") as file:
+                file.write(json.dumps(header).encode("utf-8") + b"\n")
+                for blob in blobs:
+                    file.write(blob)
+            os.replace(temporary_path, self.snapshot_path)
+        except Exception as e:
+            self.upstream_logger.info(f"[OccupancyRecorder] Unable to write snapshot to {self.snapshot_path}: {e}")
+
+    def load_snapshot(self):
+        try:
+            with open(self.snapshot_path, "rb") as file:
+                header = json.loads(file.readline())
+                data = file.read()
+        except Exception as e:
+            self.upstream_logger.info(f"[OccupancyRecorder] Unable to read snapshot from {self.snapshot_path}: {e}")
+            return
+
+        if not isinstance(header, dict) or header.get("resolution") != self.resolution or header.get("capacity") != self.capacity:
+            self.upstream_logger.info(f"[OccupancyRecorder] Ignoring snapshot {self.snapshot_path}, recorded with a different resolution or capacity.")
+            return
+
+        # Build everything first, so that a malformed snapshot is ignored as a whole
+        try:
+            restored = {"hosts": {}, "types": {}}
+            series_bytes = 2 * self.capacity * len(FIELDS)
+            if len(data) != series_bytes * len(header["series"]):
+                raise ValueError(f"{len(data)} bytes of slots for {len(header['series'])} series")
+            for index, entry in enumerate(header["series"]):
+                series = OccupancySeries(self.capacity)
+                series.slots = array('H', data[index * series_bytes:(index + 1) * series_bytes])
+                if header["byteorder"] != sys.byteorder:
+                    series.slots.byteswap()
+                series.first_slot = entry["first_slot"]
+                series.last_slot = entry["last_slot"]
+                # Allocations do not survive the restart as far as this recorder is concerned, so start from empty
+                series.advance(int(time.time()) // self.resolution)
+                restored[entry["group"]][entry["key"]] = series
+        except Exception as e:
+            self.upstream_logger.info(f"[OccupancyRecorder] Ignoring malformed snapshot {self.snapshot_path}: {e!r}")
+            return
+
+        with self.lock:
+            self.hosts.update(restored["hosts"])
+            self.types.update(restored["types"])
+        self.upstream_logger.info(f"[OccupancyRecorder] Loaded snapshot from {self.snapshot_path}.")
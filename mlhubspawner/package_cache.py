@@ -0,0 +1,135 @@
+import asyncssh
+import asyncio
+import base64
+import hashlib
+import shlex
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+# Runs on the host, as the cache owner. Arguments: cache path, digest of the package list, base64-encoded requirements.
+# Wheels accumulate in <cache>/wheels. Each package list is installed into its own directory, and
+# <cache>/site-packages/python<version> is switched over to it with a single rename, so that venvs never see a half-filled tree.
+# Only the previous tree is kept around, for kernels that were started against it.
+PREWARM_SCRIPT = """
+set -e
+cache="$1"
+digest="$2"
+version=$(python3 -c 'import sys; print("%d.%d" % sys.version_info[:2])')
+link="$cache/site-packages/python$version"
+marker="$cache/.prewarmed-python$version"
+
+if [ "$(cat "$marker" 2>/dev/null)" = "$digest" ] && [ -d "$link/" ]; then
+    echo "up-to-date"
+    exit 0
+fi
+
+mkdir -p "$cache/wheels" "$cache/site-packages"
+requirements=$(mktemp)
+trap 'rm -f "$requirements"' EXIT
+echo "$3" | base64 -d > "$requirements"
+
+target="$link-$digest"
+rm -rf "$target"
+python3 -m pip wheel --quiet --wheel-dir "$cache/wheels" --find-links "$cache/wheels" -r "$requirements"
+python3 -m pip install --quiet --no-index --find-links "$cache/wheels" --target "$target" -r "$requirements"
+
+previous=$(readlink "$link" 2>/dev/null || true)
+ln -sfn "$target" "$link.new"
+mv -T "$link.new" "$link"
+for tree in "$link"-*; do
+    if [ "$tree" != "$target" ] && [ "$tree" != "$previous" ]; then
+        rm -rf "$tree"
+    fi
+done
+
+chmod -R a+rX "$cache"
+echo "$digest" > "$marker"
+echo "prewarmed"
+"""
+
+class PackageCachePrewarmer:
+    def __init__(self, upstream_logger, cache_path: str, packages: List[str], ssh_username: str, max_concurrency: int = 4):
+        """
+        Fill the shared package cache (see MLHubSpawner.package_cache_path) of each host with the declared packages:
+        their wheels are built into <cache>/wheels, and installed into <cache>/site-packages/python<version>,
+        which initialSetup.sh links every venv against.
+
+        The hub connects as ssh_username, which must own the cache directory. A host whose cache already holds the
+        current package list (recorded in a marker file, by digest) is left untouched, so prewarming is cheap to repeat.
+        """
+        self.upstream_logger = upstream_logger
+        self.cache_path = cache_path
+        self.packages = packages
+        self.ssh_username = ssh_username
+        self.max_concurrency = max_concurrency
+        self.digest = hashlib.sha256("\n".join(sorted(packages)).encode("utf-8")).hexdigest()[:16]
+        # Report of the most recent prewarm
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._task = None
+
+    def ensure_started(self, hostnames: List[str]):
+        """
+        Prewarm the given hosts once, in the background, when the hub starts. Must be called from within the running event loop.
+        """
+        if self._task is None:
+            self.prewarm_in_background(hostnames)
+
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def prewarm_in_background(self, hostnames: List[str]):
+        """
+        Start prewarming the given hosts, unless a prewarm is already running. Must be called from within the running event loop.
+        """
+        if not self.is_running():
+            self._task = asyncio.ensure_future(self.prewarm(hostnames))
+
+    async def prewarm(self, hostnames: List[str]) -> Dict[str, Any]:
+        """
+        Prewarm the given hosts, at most max_concurrency at a time, and return the report.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def limited(hostname: str):
+            async with semaphore:
+                return await self.prewarm_host(hostname)
+
+        results = await asyncio.gather(*[limited(hostname) for hostname in hostnames])
+        report = {
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "digest": self.digest,
+            "hosts": {hostname: result for hostname, result in zip(hostnames, results)}
+        }
+        self.last_report = report
+        failed = [hostname for hostname, result in report["hosts"].items() if result["status"] == "failed"]
+        self.upstream_logger.info(f"[PackageCachePrewarmer] Prewarmed {len(hostnames) - len(failed)} of {len(hostnames)} hosts. Failed: {failed}")
+        return report
+
+    async def prewarm_host(self, hostname: str) -> Dict[str, Any]:
+        requirements = base64.b64encode("\n".join(self.packages).encode("utf-8")).decode("ascii")
+        command = f"bash -s -- {shlex.quote(self.cache_path)} {self.digest} {requirements}"
+
+        # Every failure, including a malformed hostname, only fails this host, never the whole prewarm
+        try:
+            host_ip, host_port = hostname.split(":")
+            async with asyncssh.connect(
+                host_ip,
+                port=int(host_port),
+                username=self.ssh_username,
+                client_keys=["~/.ssh/id_rsa"],
+                known_hosts=None,
+                connect_timeout=10
+            ) as conn:
+                result = await conn.run(command, input=PREWARM_SCRIPT, check=False)
+        except Exception as e:
+            self.upstream_logger.info(f"[PackageCachePrewarmer] Unable to prewarm {hostname}: {e!r}")
+            return {"status": "failed", "detail": repr(e)}
+
+        stdout = result.stdout.strip() if result.stdout else ""
+        if result.exit_status != 0 or stdout not in ("up-to-date", "prewarmed"):
+            stderr = result.stderr.strip() if result.stderr else ""
+            self.upstream_logger.info(f"[PackageCachePrewarmer] Prewarming {hostname} failed (exit status {result.exit_status}): {stderr[-500:]}")
+            return {"status": "failed", "detail": stderr[-500:]}
+
+        self.upstream_logger.info(f"[PackageCachePrewarmer] {hostname}: {stdout}.")
+        return {"status": stdout}
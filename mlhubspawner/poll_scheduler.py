@@ -0,0 +1,112 @@
+import random
+import time
+from typing import Dict, Optional
+from .token_bucket import TokenBucket
+
+class PollScheduler:
+    def __init__(self, upstream_logger, min_interval: float, max_interval: float, stable_after: float, jitter: float, max_staleness: float, host_rate_limit: float):
+        """
+        Decide when a notebook's liveness actually has to be checked over SSH, and serve cached results otherwise.
+
+        The interval between remote checks of a session grows linearly from min_interval, right after launch
+        (or after a failed check), to max_interval once the session has been stable for stable_after seconds.
+        Each scheduled check is jittered by up to `jitter` (fraction of the interval) earlier, so that sessions
+        started together spread out over the window.
+
+        Remote checks are additionally capped at host_rate_limit per second for each host (0 disables the cap).
+        A session whose cached result is older than max_staleness is always checked, regardless of the cap.
+
+        Note: This is only used from the event loop, hence no locking.
+        """
+        self.upstream_logger = upstream_logger
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.stable_after = stable_after
+        self.jitter = jitter
+        self.max_staleness = max_staleness
+        self.host_rate_limit = host_rate_limit
+        # Maps unique_identifier -> session scheduling details
+        self.sessions: Dict[str, Dict] = {}
+        # Maps hostname -> TokenBucket limiting the remote checks towards that host
+        self.host_buckets: Dict[str, TokenBucket] = {}
+
+    def register(self, unique_identifier: str, hostname: str):
+        """
+        Start tracking a freshly launched (or freshly restored) session. It is considered alive as of now.
+        """
+        now = time.monotonic()
+        self.sessions[unique_identifier] = {
+            'hostname': hostname,
+            'stable_since': now,
+            'last_checked': now,
+            'next_check': now + self._next_interval(0)
+        }
+
+    def forget(self, unique_identifier: str):
+        """
+        Stop tracking a session, e.g. once it is stopped or found dead.
+        """
+        self.sessions.pop(unique_identifier, None)
+
+    def _next_interval(self, stable_for: float) -> float:
+        progress = min(1.0, stable_for / self.stable_after) if self.stable_after > 0 else 1.0
+        interval = self.min_interval + (self.max_interval - self.min_interval) * progress
+        return interval * (1.0 - random.uniform(0.0, self.jitter))
+
+    def should_check(self, unique_identifier: str, hostname: str) -> bool:
+        """
+        Whether the session has to be checked remotely now. If not, its cached result (alive) may be used.
+        Unknown sessions are always checked.
+        """
+        session = self.sessions.get(unique_identifier)
+        if session is None or session['hostname'] != hostname:
+            return True
+
+        now = time.monotonic()
+        if now - session['last_checked'] >= self.max_staleness:
+            return True
+        if now < session['next_check']:
+            return False
+        if self.host_rate_limit <= 0:
+            return True
+
+        bucket = self.host_buckets.get(hostname)
+        if bucket is None:
+            bucket = TokenBucket(self.host_rate_limit, max(1.0, self.host_rate_limit))
+            self.host_buckets[hostname] = bucket
+        if not bucket.try_take():
+            self.upstream_logger.debug("[PollScheduler] Rate limit reached for %s, serving cached result for UID %s.", hostname, unique_identifier)
+            return False
+        return True
+
+    def record_result(self, unique_identifier: str, hostname: str, alive: Optional[bool]):
+        """
+        Record the outcome of a remote check: True (alive), False (dead) or None (the check itself failed).
+
+        Failed checks make the session flaky: it goes back to being checked at min_interval. The last successful
+        check is kept, so a flaky session stays alive until its cached result exceeds max_staleness.
+        Returns whether the session should be reported as alive.
+        """
+        if alive is False:
+            self.forget(unique_identifier)
+            return False
+
+        session = self.sessions.get(unique_identifier)
+        if session is None or session['hostname'] != hostname:
+            if alive is None:
+                # Nothing known about this session yet, so there is no good result to fall back on
+                return False
+            self.register(unique_identifier, hostname)
+            return True
+
+        now = time.monotonic()
+        if alive is None:
+            session['stable_since'] = now
+            session['next_check'] = now + self._next_interval(0)
+            alive_enough = (now - session['last_checked']) < self.max_staleness
+            self.upstream_logger.info("[PollScheduler] Check failed for UID %s on %s, last success %.0fs ago.", unique_identifier, hostname, now - session['last_checked'])
+            return alive_enough
+
+        session['last_checked'] = now
+        session['next_check'] = now + self._next_interval(now - session['stable_since'])
+        return True
@@ -1,5 +1,5 @@
 from traitlets.config import Configurable
-from traitlets import  Unicode, Integer, Bool, List
+from traitlets import  Unicode, Integer, Bool, List, Float, Enum
 import json
 
 class RemoteGenericHost(Configurable):
@@ -15,6 +15,12 @@ class RemoteGenericHost(Configurable):
     # Whether privileged access is required to access this host
     privileged_access_required = Bool(help="Whether privileged access is required to access this host").tag(config=True, private_info = True)
 
+    # Idle policy for exclusive allocations of this machine type. Disabled when idle_timeout is 0.
+    idle_timeout = Integer(0, help="Seconds without user activity after which an exclusive allocation is considered idle (0 disables)").tag(config=True, private_info = True)
+    idle_action = Enum(["warn", "downgrade", "stop"], default_value="warn", help="What to do with an idle exclusive allocation: log a warning, downgrade it to shared access, or stop the notebook").tag(config=True, private_info = True)
+    idle_cpu_threshold = Float(5.0, help="CPU usage (percent of one core) below which the user's processes count as idle").tag(config=True, private_info = True)
+    idle_gpu_threshold = Float(5.0, help="Average GPU utilization (percent) below which the host's GPUs count as idle").tag(config=True, private_info = True)
+
 
     # ==== METHODS ====
 
@@ -0,0 +1,36 @@
+#!/bin/bash
+# MLHub notebook launcher. The hub installs this file on every host, either once per host as
+# <launcher_directory>/launcher-<version>-<hash>.sh, or per user as ~/.mlhub/launcher.sh, which it replaces
+# whenever its hash differs from the hub's copy. Either way, local changes are overwritten.
+# Bump the version below on every change, so that the installed version can be told apart on a host.
+#
+# Usage: bash launcher.sh <port> <notebook command> [arguments...]
+#        bash launcher.sh --version
+# Standard input: the notebook's environment, as gzipped, base64-encoded, NUL-separated KEY=VALUE entries.
+# Prints the PID of the notebook, which is also its session and process group ID.
+
+# mlhub-launcher-version: 2
+if [ "$1" = "--version" ]; then
+    sed -n 's/^# mlhub-launcher-version: //p' "${BASH_SOURCE[0]}"
+    exit 0
+fi
+
+port="$1"
+shift
+
+# Values are exported verbatim, so quotes, spaces and newlines in them need no escaping
+while IFS= read -r -d '' entry; do
+    export "$entry"
+done < <(base64 -d | gzip -dc)
+
+unset XDG_RUNTIME_DIR
+touch .jupyter.log
+chmod 600 .jupyter.log
+run=true source initialSetup.sh >> .jupyter.log
+
+# The notebook runs in its own session, so it can be signalled as a group. Kernels start their own sessions,
+# so the hub also tracks the notebook's descendants when stopping it (see NotebookManager.kill_notebook).
+# A background job of a non-interactive shell is never a process group leader, so setsid does not
+# fork and the PID we get here is also the session and process group ID.
+setsid "$@" --port "$port" < /dev/null >> .jupyter.log 2>&1 &
+echo $!
@@ -1,12 +1,19 @@
 def spawner_load_state(spawner_self, state):
     """
     Load the spawner's state from a saved state dictionary.
-    It sets the PID, remote IP, and hostname.
+    It sets the PID, process group ID, remote IP, and hostname.
     Validates that the hostname is still valid,
     and if not, clears the state.
+    The host affinity is handed to the MachineManager, independently of the rest of the state.
+    The allocation of a running notebook is registered with the MachineManager again, from its codename and access mode.
     """
+    if "affinity_hostname" in state:
+        spawner_self._machine_manager.restore_affinity(spawner_self.user_unique_identifier, state["affinity_hostname"])
+
     if "pid" in state:
         spawner_self.state_pid = state["pid"]
+    if "pgid" in state:
+        spawner_self.state_pgid = state["pgid"]
     if "hostname" in state:
         spawner_self.state_hostname = state["hostname"]
     if "notebook_port" in state:
@@ -17,14 +24,16 @@ def spawner_load_state(spawner_self, state):
         spawner_clear_state(spawner_self)
         return
 
-    valid = False
-    for host in spawner_self.remote_hosts:
-        if spawner_self.state_hostname in host.hostnames:
-            valid = True
-            break
+    # The host catalog may have been reloaded since the spawner was configured, so ask the MachineManager
+    valid = spawner_self._machine_manager.knows_hostname(spawner_self.state_hostname)
 
     if not valid:
         spawner_clear_state(spawner_self)
+        return
+
+    if spawner_self.state_pid and spawner_self.state_notebook_port:
+        with spawner_self._machine_manager_lock:
+            spawner_self._machine_manager.restore_allocation(spawner_self.user_unique_identifier, state.get("codename"), spawner_self.state_hostname, state.get("shared"))
 
 def spawner_get_state(spawner_self):
     """
@@ -33,16 +42,28 @@ def spawner_get_state(spawner_self):
     state = {}
     if spawner_self.state_pid:
         state["pid"] = spawner_self.state_pid
+    if spawner_self.state_pgid:
+        state["pgid"] = spawner_self.state_pgid
     if spawner_self.state_hostname:
         state["hostname"] = spawner_self.state_hostname
     if spawner_self.state_notebook_port:
         state["notebook_port"] = spawner_self.state_notebook_port
+    # Needed to register the allocation again after a hub restart. The access mode may have been downgraded since the start.
+    allocation = spawner_self._machine_manager.allocations.get(spawner_self.user_unique_identifier)
+    if allocation is not None and allocation['hostname'] == spawner_self.state_hostname:
+        state["codename"] = allocation['machine'].codename
+        state["shared"] = allocation['shared_access_enabled']
+    # The affinity outlives the notebook itself, so it is persisted even when the rest of the state is cleared
+    affinity_hostname = spawner_self._machine_manager.get_affinity(spawner_self.user_unique_identifier)
+    if affinity_hostname:
+        state["affinity_hostname"] = affinity_hostname
     return state
 
 def spawner_clear_state(spawner_self):
     """
-    Clear the spawner state, resetting remote IP, PID, codename, and hostname.
+    Clear the spawner state, resetting remote IP, PID, process group ID, codename, and hostname.
     """
     spawner_self.state_pid = 0
+    spawner_self.state_pgid = 0
     spawner_self.state_hostname = None
     spawner_self.state_notebook_port = None
@@ -0,0 +1,42 @@
+import time
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        """
+        A token bucket refilled continuously at `rate` tokens per second, holding at most `capacity` tokens.
+        It starts full, so a burst of up to `capacity` is allowed right away.
+
+        Not thread-safe on its own; callers either use it from the event loop only, or hold their own lock.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def try_take(self, amount: float = 1.0) -> bool:
+        """
+        Take `amount` tokens if they are available. Never blocks.
+        Returns True if the tokens were taken, False otherwise.
+        """
+        self._refill(time.monotonic())
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+    def is_full(self) -> bool:
+        """
+        Whether the bucket has refilled completely, i.e. it holds no information worth keeping around.
+        """
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+    def give_back(self, amount: float = 1.0):
+        """
+        Return tokens taken by try_take, e.g. when the request they were taken for was rejected by another limit.
+        """
+        self.tokens = min(self.capacity, self.tokens + amount)
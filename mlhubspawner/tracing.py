@@ -0,0 +1,188 @@
+import atexit
+import contextvars
+import json
+import os
+import time
+from threading import Event, Lock, Thread
+from typing import Any, Dict, Optional
+
+# The span currently in progress, in this thread or asyncio task. New spans become its children.
+_current_span = contextvars.ContextVar("mlhubspawner_current_span", default=None)
+
+class _NoopSpan:
+    """
+    Stand-in returned by a disabled Tracer. A single shared instance, so that disabled tracing costs near zero:
+    only the call itself, its keyword arguments and the evaluation of the attribute values remain.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+class Span:
+    def __init__(self, tracer, name: str, attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.parent = None
+        self.trace_id = None
+        self.span_id = os.urandom(8).hex()
+        self.start_time_ns = 0
+        self.end_time_ns = 0
+        self.error = None
+        self._token = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        self.trace_id = self.parent.trace_id if self.parent is not None else os.urandom(16).hex()
+        self._token = _current_span.set(self)
+        self.start_time_ns = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.end_time_ns = time.time_ns()
+        _current_span.reset(self._token)
+        if exc_value is not None:
+            self.error = repr(exc_value)
+        self.tracer.exporter.export(self)
+        # Never swallow the exception
+        return False
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """
+        Return the span in the OTLP/JSON span encoding, so the exported files can be fed to OTLP tooling as-is.
+        """
+        data = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_time_ns),
+            "endTimeUnixNano": str(self.end_time_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1}
+        }
+        if self.parent is not None:
+            data["parentSpanId"] = self.parent.span_id
+        return data
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+# Most spans written in a single ExportTraceServiceRequest line
+SPANS_PER_LINE = 100
+
+class FileSpanExporter:
+    def __init__(self, file_path: str, service_name: str = "mlhubspawner", max_bytes: int = 100 * 1024 * 1024, backup_count: int = 3, flush_interval: float = 5.0, max_buffered_spans: int = 10000):
+        """
+        Write finished spans to a local file, as OTLP/JSON ExportTraceServiceRequests, one per line.
+        This works fully offline; the file can later be replayed to any OTLP/HTTP JSON endpoint.
+
+        export() only queues the span. A background thread serializes and writes the queued spans every flush_interval
+        seconds, so no file I/O happens where spans finish (on the event loop, or under the allocation lock).
+        Once the file would grow beyond max_bytes, it is rotated like a logging RotatingFileHandler would, keeping
+        backup_count older files (file.1 being the most recent). If writing falls behind, spans beyond
+        max_buffered_spans are dropped and counted.
+        """
+        self.file_path = file_path
+        self.resource = {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]}
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self.max_buffered_spans = max_buffered_spans
+        self.dropped_spans = 0
+        # Spans finish on the event loop as well as in executor threads
+        self.buffer_lock = Lock()
+        self.buffer = []
+        # Only one flush writes to the file at a time (the background thread, or the one at exit)
+        self.file_lock = Lock()
+        self._wake = Event()
+        self._thread = Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def export(self, span: Span):
+        with self.buffer_lock:
+            if len(self.buffer) >= self.max_buffered_spans:
+                self.dropped_spans += 1
+                return
+            self.buffer.append(span)
+            if len(self.buffer) >= self.max_buffered_spans // 2:
+                self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self.buffer_lock:
+            spans, self.buffer = self.buffer, []
+        try:
+            with self.file_lock:
+                # Bounded lines keep every file close to max_bytes, however many spans were queued
+                for start in range(0, len(spans), SPANS_PER_LINE):
+                    line = json.dumps({
+                        "resourceSpans": [{
+                            "resource": self.resource,
+                            "scopeSpans": [{"scope": {"name": "mlhubspawner"}, "spans": [span.to_otlp() for span in spans[start:start + SPANS_PER_LINE]]}]
+                        }]
+                    }) + "\n"
+                    self._rotate_if_needed(len(line))
+                    with open(self.file_path, "a") as file:
+                        file.write(line)
+        except Exception:
+            # Tracing must never break a spawn
+            pass
+
+    def _rotate_if_needed(self, incoming_bytes: int):
+        if self.max_bytes <= 0:
+            return
+        try:
+            size = os.path.getsize(self.file_path)
+        except OSError:
+            return
+        if size == 0 or size + incoming_bytes <= self.max_bytes:
+            return
+        if self.backup_count <= 0:
+            os.truncate(self.file_path, 0)
+            return
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.file_path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.file_path}.{index + 1}")
+        os.replace(self.file_path, f"{self.file_path}.1")
+
+class Tracer:
+    def __init__(self, exporter: Optional[FileSpanExporter] = None):
+        """
+        Create spans exported through the given exporter. Without an exporter, tracing is disabled,
+        and span() returns a shared no-op span.
+        """
+        self.exporter = exporter
+        self.enabled = exporter is not None
+
+    def span(self, name: str, **attributes):
+        """
+        Return a context manager timing the enclosed block as a span named `name`, with the given attributes.
+        Spans opened inside the block (also in awaited coroutines) become its children.
+        """
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, attributes)
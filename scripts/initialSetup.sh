@@ -30,9 +30,22 @@ fi
 source "$VENV_PATH/bin/activate"
 
 # Set pip cache location
-export XDG_CACHE_HOME="$CACHE_PATH"
+export XDG_CACHE_HOME="${CACHE_PATH:-$HOME/.cache}"
 mkdir -p "$XDG_CACHE_HOME"
 
+# Link the venv against the host's shared package cache, if the hub configured one (see MLHubSpawner.package_cache_path)
+if [[ -n "$MLHUB_PACKAGE_CACHE" && -d "$MLHUB_PACKAGE_CACHE" ]]; then
+    PYTHON_VERSION=$(python -c 'import sys; print("%d.%d" % sys.version_info[:2])')
+    SHARED_SITE_PACKAGES="$MLHUB_PACKAGE_CACHE/site-packages/python$PYTHON_VERSION"
+    # Prewarmed packages are importable right away, after anything installed in the venv itself
+    if [[ -d "$SHARED_SITE_PACKAGES" ]]; then
+        VENV_SITE_PACKAGES=$(python -c 'import sysconfig; print(sysconfig.get_paths()["purelib"])')
+        echo "$SHARED_SITE_PACKAGES" > "$VENV_SITE_PACKAGES/mlhub-package-cache.pth"
+    fi
+    # Anything else is installed from the prebuilt wheels when possible
+    export PIP_FIND_LINKS="$MLHUB_PACKAGE_CACHE/wheels"
+fi
+
 # Register IPython kernel
 python -m ipykernel install --user --name venv
 
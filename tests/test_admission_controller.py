@@ -0,0 +1,105 @@
+"""
+AdmissionController and TokenBucket, against a fake clock.
+"""
+import logging
+
+import pytest
+
+from mlhubspawner import token_bucket
+from mlhubspawner.admission_controller import AdmissionController
+from mlhubspawner.token_bucket import TokenBucket
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(token_bucket.time, "monotonic", clock.monotonic)
+    return clock
+
+def make_controller(user_rate=6, user_burst=2, type_rate=0, type_burst=0, max_launches_per_host=0):
+    return AdmissionController(logging.getLogger("test_admission_controller"), user_rate, user_burst, type_rate, type_burst, max_launches_per_host)
+
+def test_token_bucket_refills_up_to_capacity(clock):
+    bucket = TokenBucket(0.5, 2)
+    assert bucket.try_take() and bucket.try_take()
+    assert not bucket.try_take()
+
+    clock.now += 2
+    assert bucket.try_take()
+    assert not bucket.try_take()
+
+    clock.now += 3600
+    assert bucket.is_full()
+    assert bucket.tokens == 2
+
+def test_burst_then_rejection(clock):
+    controller = make_controller(user_rate=6, user_burst=2)
+    assert controller.admit("alice", "gpu") is None
+    assert controller.admit("alice", "gpu") is None
+    assert controller.admit("alice", "gpu") is not None
+    # Other users have their own bucket
+    assert controller.admit("bob", "gpu") is None
+
+    # 6 per minute: one token every 10 seconds
+    clock.now += 10
+    assert controller.admit("alice", "gpu") is None
+    assert controller.admit("alice", "gpu") is not None
+    assert controller.stats()["counters"] == {"admitted": 4, "rejected_user_rate": 2, "rejected_type_rate": 0, "rejected_host_launches": 0}
+
+def test_type_rejection_gives_the_user_token_back(clock):
+    controller = make_controller(user_rate=6, user_burst=1, type_rate=6, type_burst=1)
+    assert controller.admit("alice", "gpu") is None
+
+    # Bob's token is given back when the type limit rejects him, so he can still spawn another type
+    assert controller.admit("bob", "gpu") is not None
+    assert controller.user_buckets["bob"].tokens == 1
+    assert controller.admit("bob", "cpu") is None
+    assert controller.admit("bob", "cpu") is not None
+    assert controller.stats()["counters"] == {"admitted": 2, "rejected_user_rate": 1, "rejected_type_rate": 1, "rejected_host_launches": 0}
+
+def test_zero_rates_disable_the_limits(clock):
+    controller = make_controller(user_rate=0, user_burst=0, type_rate=0, type_burst=0)
+    for _ in range(100):
+        assert controller.admit("alice", "gpu") is None
+    assert controller.user_buckets == {} and controller.type_buckets == {}
+
+def test_saturated_hosts_follow_launches_in_flight():
+    controller = make_controller(max_launches_per_host=2)
+    controller.acquire_launch("h1:22")
+    assert controller.saturated_hosts() == frozenset()
+    controller.acquire_launch("h1:22")
+    controller.acquire_launch("h2:22")
+    assert controller.saturated_hosts() == {"h1:22"}
+
+    controller.release_launch("h1:22")
+    assert controller.saturated_hosts() == frozenset()
+    controller.release_launch("h1:22")
+    controller.release_launch("h2:22")
+    assert controller.launches_in_flight == {}
+
+    assert controller.reject_host_launches("alice", "gpu")
+    assert controller.stats()["counters"]["rejected_host_launches"] == 1
+
+def test_zero_max_launches_disables_the_cap():
+    controller = make_controller(max_launches_per_host=0)
+    for _ in range(10):
+        controller.acquire_launch("h1:22")
+    assert controller.saturated_hosts() == frozenset()
+
+def test_full_buckets_are_evicted_past_1024_users(clock):
+    controller = make_controller(user_rate=6, user_burst=1)
+    for index in range(1024):
+        assert controller.admit(f"user-{index}", "gpu") is None
+    assert len(controller.user_buckets) == 1024
+
+    # Only the buckets that refilled since are dropped
+    clock.now += 10
+    assert controller.admit("user-0", "gpu") is None
+    assert controller.admit("newcomer", "gpu") is None
+    assert set(controller.user_buckets) == {"user-0", "newcomer"}
@@ -0,0 +1,105 @@
+"""
+Host catalog parsing and hot reloads (MachineManager.apply_host_catalog), with host probes replaced by a stub.
+"""
+import json
+import logging
+from threading import Lock
+
+import pytest
+
+from mlhubspawner.fleet_config import FleetConfigWatcher, parse_host_catalog
+from mlhubspawner.machine_manager import MachineManager
+
+class OnlineMachineManager(MachineManager):
+    def is_machine_online(self, hostname_ip: str) -> bool:
+        return True
+
+def catalog(*hostnames, codename="gpu"):
+    return parse_host_catalog([{"codename": codename, "hostnames": list(hostnames), "shared_access_enabled": True}])
+
+def make_manager(*hostnames):
+    return OnlineMachineManager(logging.getLogger("test_fleet_config"), catalog(*hostnames))
+
+def test_added_hostnames_are_schedulable_right_away():
+    manager = make_manager("h1:22")
+    summary = manager.apply_host_catalog(catalog("h1:22", "h2:22"))
+
+    assert summary == {"added": ["h2:22"], "removed": [], "draining": []}
+    machine_type = manager.get_type("gpu")
+    assert manager.take_machine(machine_type, "h1:22", "alice", True)
+    assert manager.find_machine(machine_type, True, "bob") == "h2:22"
+
+def test_removed_hostnames_without_allocations_are_forgotten():
+    manager = make_manager("h1:22", "h2:22")
+    summary = manager.apply_host_catalog(catalog("h1:22"))
+
+    assert summary == {"added": [], "removed": ["h2:22"], "draining": []}
+    assert not manager.knows_hostname("h2:22")
+    assert manager.get_hostnames() == ["h1:22"]
+
+def test_removed_hostnames_with_allocations_drain_until_released():
+    manager = make_manager("h1:22", "h2:22")
+    old_type = manager.get_type("gpu")
+    assert manager.take_machine(old_type, "h2:22", "alice", True)
+
+    summary = manager.apply_host_catalog(catalog("h1:22"))
+    assert summary["draining"] == ["h2:22"]
+    assert manager.knows_hostname("h2:22")
+    assert manager.get_hostnames() == ["h1:22"]
+
+    # No new placements go to the draining host, even for requests made against the old catalog
+    assert manager.find_machine(old_type, True, "bob") == "h1:22"
+    assert not manager.take_machine(old_type, "h2:22", "bob", True)
+    assert manager.find_machine(old_type, False, "carol") == "h1:22"
+
+    manager.release_machine("alice")
+    assert manager.draining_hostnames == set()
+    assert not manager.knows_hostname("h2:22")
+
+def test_hostnames_added_back_while_draining_stop_draining():
+    manager = make_manager("h1:22", "h2:22")
+    assert manager.take_machine(manager.get_type("gpu"), "h2:22", "alice", True)
+    manager.apply_host_catalog(catalog("h1:22"))
+
+    summary = manager.apply_host_catalog(catalog("h1:22", "h2:22"))
+    assert summary == {"added": ["h2:22"], "removed": [], "draining": []}
+    assert manager.take_machine(manager.get_type("gpu"), "h2:22", "bob", True)
+
+    # Released allocations no longer make it forget the host
+    manager.release_machine("alice")
+    manager.release_machine("bob")
+    assert manager.knows_hostname("h2:22")
+
+def test_removed_types_refuse_placement():
+    manager = make_manager("h1:22")
+    old_type = manager.get_type("gpu")
+    manager.apply_host_catalog(catalog("h1:22", codename="cpu"))
+
+    assert manager.find_machine(old_type, True, "alice") is None
+    assert not manager.take_machine(old_type, "h1:22", "alice", True)
+
+@pytest.mark.parametrize("hostname", ["h1", "h1:", ":22", "h1:ssh", "h1:0", "h1:65536", "h1:22:23"])
+def test_hostnames_must_be_ip_port(hostname):
+    with pytest.raises(ValueError):
+        catalog("h2:22", hostname)
+
+def test_a_bad_entry_rejects_the_whole_catalog():
+    with pytest.raises(ValueError):
+        parse_host_catalog([{"codename": "gpu", "hostnames": ["h1:22"]}, {"codename": "cpu", "hostnames": ["h2"]}])
+    with pytest.raises(ValueError):
+        parse_host_catalog([{"codename": "gpu", "hostnames": ["h1:22"]}, {"codename": "gpu", "hostnames": ["h2:22"]}])
+    with pytest.raises(ValueError):
+        parse_host_catalog({"codename": "gpu"})
+
+def test_malformed_file_keeps_the_current_catalog(tmp_path):
+    path = tmp_path / "fleet.json"
+    manager = make_manager("h1:22")
+    watcher = FleetConfigWatcher(logging.getLogger("test_fleet_config"), manager, Lock(), str(path), 0)
+
+    path.write_text(json.dumps([{"codename": "gpu", "hostnames": ["h1:22", "h2"]}]))
+    with pytest.raises(ValueError):
+        watcher.reload()
+    assert manager.get_hostnames() == ["h1:22"]
+
+    path.write_text(json.dumps([{"codename": "gpu", "hostnames": ["h1:22", "h2:22"]}]))
+    assert watcher.reload()["added"] == ["h2:22"]
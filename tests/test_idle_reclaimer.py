@@ -0,0 +1,105 @@
+"""
+IdleReclaimer against notebooks restored after a hub restart, with stand-ins for the hub's spawner, user and proxy.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from threading import Lock
+from types import SimpleNamespace
+
+from mlhubspawner.idle_reclaimer import IdleReclaimer
+from mlhubspawner.machine_manager import MachineManager
+from mlhubspawner.remote_hosts.remote_ml_host import RemoteMLHost
+from mlhubspawner.state_manager import spawner_get_state, spawner_load_state
+
+HOSTNAME = "10.0.0.1:22"
+
+class FakeUser:
+    def __init__(self, proxy):
+        self.settings = {"proxy": proxy}
+        self.stopped = []
+
+    async def stop(self, server_name):
+        self.stopped.append(server_name)
+
+class FakeProxy:
+    def __init__(self):
+        self.deleted = []
+
+    async def delete_user(self, user, server_name):
+        self.deleted.append(server_name)
+
+class FakeNotebookManager:
+    async def sample_utilization(self, sample_seconds):
+        return (0.0, None)
+
+def make_hub():
+    """
+    The class-level state of MLHubSpawner, as it is right after the hub (re)starts.
+    """
+    machine_type = RemoteMLHost(codename="gpu", hostnames=[HOSTNAME], shared_access_enabled=True, idle_timeout=60, idle_action="stop")
+    return MachineManager(logging.getLogger("test_idle_reclaimer"), [machine_type]), Lock(), machine_type
+
+def make_spawner(machine_manager, lock, idle_for):
+    return SimpleNamespace(
+        _machine_manager=machine_manager,
+        _machine_manager_lock=lock,
+        user_unique_identifier="alice",
+        state_pid=0, state_pgid=0, state_hostname=None, state_notebook_port=None,
+        name="",
+        pending=None,
+        user=FakeUser(FakeProxy()),
+        orm_spawner=SimpleNamespace(last_activity=datetime.utcnow() - timedelta(seconds=idle_for)),
+        notebook_manager=FakeNotebookManager()
+    )
+
+def saved_state(shared):
+    machine_manager, lock, machine_type = make_hub()
+    spawner = make_spawner(machine_manager, lock, 0)
+    assert machine_manager.take_machine(machine_type, HOSTNAME, "alice", shared)
+    spawner.state_pid, spawner.state_pgid, spawner.state_hostname, spawner.state_notebook_port = 4242, 4242, HOSTNAME, 8888
+    return spawner_get_state(spawner)
+
+def test_restored_exclusive_session_is_reclaimed():
+    state = saved_state(shared=False)
+    assert state["codename"] == "gpu" and state["shared"] is False
+
+    # After the restart, nothing but the saved state is left
+    machine_manager, lock, machine_type = make_hub()
+    spawner = make_spawner(machine_manager, lock, 3600)
+    spawner_load_state(spawner, state)
+    reclaimer = IdleReclaimer(logging.getLogger("test_idle_reclaimer"), machine_manager, lock, 0, False)
+    reclaimer.register("alice", spawner)
+
+    # The restored allocation blocks the host, like before the restart
+    assert machine_manager.allocations["alice"]["shared_access_enabled"] is False
+    assert machine_manager.find_machine(machine_type, True, "bob") is None
+
+    report = asyncio.run(reclaimer.check_once())
+    assert report["exclusive_allocations_checked"] == 1
+    assert [entry["action"] for entry in report["idle"]] == ["stop"]
+    assert spawner.user.settings["proxy"].deleted == [""]
+    assert spawner.user.stopped == [""]
+
+def test_restored_shared_session_is_not_checked():
+    state = saved_state(shared=True)
+
+    machine_manager, lock, machine_type = make_hub()
+    spawner = make_spawner(machine_manager, lock, 3600)
+    spawner_load_state(spawner, state)
+
+    assert machine_manager.hostname_allocations == {HOSTNAME: ["alice"]}
+    report = asyncio.run(IdleReclaimer(logging.getLogger("test_idle_reclaimer"), machine_manager, lock, 0, False).check_once())
+    assert report["exclusive_allocations_checked"] == 0
+
+def test_state_without_access_mode_is_not_restored():
+    state = saved_state(shared=False)
+    del state["codename"], state["shared"]
+
+    machine_manager, lock, machine_type = make_hub()
+    spawner = make_spawner(machine_manager, lock, 3600)
+    spawner_load_state(spawner, state)
+
+    # The notebook itself is still restored, only its allocation is unknown
+    assert spawner.state_pid == 4242
+    assert machine_manager.allocations == {}
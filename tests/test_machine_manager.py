@@ -0,0 +1,107 @@
+"""
+MachineManager placement, with host probes replaced by a stub (as in benchmarks/allocation_lock.py).
+"""
+import logging
+
+from mlhubspawner.machine_manager import MachineManager
+from mlhubspawner.remote_hosts.remote_ml_host import RemoteMLHost
+
+class StubMachineManager(MachineManager):
+    """
+    Every host is online unless listed in offline. Each probe is recorded, in order.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.offline = set()
+        self.probes = []
+
+    def is_machine_online(self, hostname_ip: str) -> bool:
+        self.probes.append(hostname_ip)
+        return hostname_ip not in self.offline
+
+def make_manager(shared=True, affinity_load_tolerance=0, hostnames=("10.0.0.1:22", "10.0.0.2:22", "10.0.0.3:22")):
+    machine_type = RemoteMLHost(codename="gpu", hostnames=list(hostnames), shared_access_enabled=shared)
+    manager = StubMachineManager(logging.getLogger("test_machine_manager"), [machine_type], affinity_enabled=True, affinity_load_tolerance=affinity_load_tolerance)
+    return manager, machine_type
+
+def fill(manager, machine_type, hostname, count, shared=True):
+    for index in range(count):
+        assert manager.take_machine(machine_type, hostname, f"{hostname}-{index}", shared)
+
+def test_affinity_host_within_tolerance_is_kept():
+    manager, machine_type = make_manager(affinity_load_tolerance=1)
+    manager.restore_affinity("alice", "10.0.0.2:22")
+    fill(manager, machine_type, "10.0.0.2:22", 1)
+
+    assert manager.find_machine(machine_type, True, "alice") == "10.0.0.2:22"
+    # Within the tolerance of any host, so the rest of the fleet is not probed
+    assert manager.probes == ["10.0.0.2:22"]
+
+def test_affinity_host_over_tolerance_is_left():
+    manager, machine_type = make_manager(affinity_load_tolerance=1)
+    manager.restore_affinity("alice", "10.0.0.2:22")
+    fill(manager, machine_type, "10.0.0.1:22", 1)
+    fill(manager, machine_type, "10.0.0.2:22", 3)
+    fill(manager, machine_type, "10.0.0.3:22", 1)
+
+    assert manager.find_machine(machine_type, True, "alice") == "10.0.0.1:22"
+    assert manager.probes.count("10.0.0.2:22") == 1
+
+def test_affinity_host_over_least_loaded_but_within_tolerance_is_kept():
+    manager, machine_type = make_manager(affinity_load_tolerance=1)
+    manager.restore_affinity("alice", "10.0.0.2:22")
+    for hostname in machine_type.hostnames:
+        fill(manager, machine_type, hostname, 2)
+    manager.release_machine("10.0.0.3:22-0")
+
+    assert manager.find_machine(machine_type, True, "alice") == "10.0.0.2:22"
+    assert sorted(manager.probes) == sorted(machine_type.hostnames)
+
+def test_exclusive_affinity():
+    manager, machine_type = make_manager(shared=False)
+    manager.restore_affinity("alice", "10.0.0.3:22")
+
+    assert manager.find_machine(machine_type, False, "alice") == "10.0.0.3:22"
+    assert manager.probes == ["10.0.0.3:22"]
+
+def test_busy_exclusive_affinity_host_is_not_probed():
+    manager, machine_type = make_manager(shared=False)
+    manager.restore_affinity("alice", "10.0.0.1:22")
+    assert manager.take_machine(machine_type, "10.0.0.1:22", "bob", False)
+
+    assert manager.find_machine(machine_type, False, "alice") == "10.0.0.2:22"
+    assert manager.probes == ["10.0.0.2:22"]
+
+def test_shared_affinity_host_held_exclusively_is_not_probed():
+    manager, machine_type = make_manager()
+    manager.restore_affinity("alice", "10.0.0.1:22")
+    assert manager.take_machine(machine_type, "10.0.0.1:22", "bob", False)
+
+    assert manager.find_machine(machine_type, True, "alice") == "10.0.0.2:22"
+    assert "10.0.0.1:22" not in manager.probes
+
+def test_offline_affinity_host_is_probed_once():
+    for shared in (True, False):
+        manager, machine_type = make_manager(shared=shared)
+        manager.restore_affinity("alice", "10.0.0.1:22")
+        manager.offline.add("10.0.0.1:22")
+
+        assert manager.find_machine(machine_type, shared, "alice") == "10.0.0.2:22"
+        assert manager.probes == ["10.0.0.1:22", "10.0.0.2:22"]
+
+def test_stale_affinity_is_rejected_on_restore():
+    manager, machine_type = make_manager()
+    manager.restore_affinity("alice", "10.9.9.9:22")
+    assert manager.get_affinity("alice") is None
+
+    fill(manager, machine_type, "10.0.0.1:22", 1)
+    assert manager.find_machine(machine_type, True, "alice") == "10.0.0.2:22"
+
+def test_excluded_hostnames_are_skipped_without_probing():
+    manager, machine_type = make_manager()
+    manager.restore_affinity("alice", "10.0.0.1:22")
+    excluded = frozenset({"10.0.0.1:22", "10.0.0.2:22"})
+
+    assert manager.find_machine(machine_type, True, "alice", excluded) == "10.0.0.3:22"
+    assert manager.probes == ["10.0.0.3:22"]
+    assert manager.find_machine(machine_type, False, "alice", excluded | {"10.0.0.3:22"}) is None
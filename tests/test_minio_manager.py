@@ -0,0 +1,129 @@
+"""
+MinIOManager against a local S3-compatible server (moto), see tests/requirements.txt.
+"""
+import asyncio
+import pytest
+from minio import Minio
+from minio.error import S3Error
+from urllib3.exceptions import ProtocolError
+
+from mlhubspawner.minio_manager import MinIOManager
+
+moto_server = pytest.importorskip("moto.server")
+
+class CountingClient:
+    """
+    Wraps a real Minio client, counting the calls to each method. Failures can be queued per method,
+    and are raised (in order) by the next calls instead of reaching the server.
+    """
+    def __init__(self, client):
+        self.client = client
+        self.calls = {}
+        self.failures = {}
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+
+        def counted(*args, **kwargs):
+            self.calls[name] = self.calls.get(name, 0) + 1
+            if self.failures.get(name):
+                raise self.failures[name].pop(0)
+            return method(*args, **kwargs)
+        return counted
+
+    def total_calls(self):
+        return sum(self.calls.values())
+
+def s3_error(code):
+    return S3Error(None, code, code, None, None, None)
+
+@pytest.fixture(scope="module")
+def s3_endpoint():
+    server = moto_server.ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f"127.0.0.1:{port}"
+    server.stop()
+
+@pytest.fixture
+def make_manager(s3_endpoint):
+    managers = []
+
+    def make(region=None):
+        manager = MinIOManager(f"http://{s3_endpoint}", "access", "secret", retry_backoff=0.01)
+        if region is not None:
+            manager.client = Minio(s3_endpoint, access_key="access", secret_key="secret", secure=False, region=region)
+        manager.client = CountingClient(manager.client)
+        managers.append(manager)
+        return manager
+    yield make
+    for manager in managers:
+        manager.executor.shutdown(wait=False)
+
+def test_preload_loads_existing_buckets_in_bulk(make_manager):
+    setup = make_manager()
+    setup.client.make_bucket("preload-a")
+    setup.client.make_bucket("preload-b")
+
+    manager = make_manager()
+    asyncio.run(manager._load_known_buckets())
+
+    assert {"preload-a", "preload-b"} <= manager.known_buckets
+    assert manager.client.calls == {"list_buckets": 1}
+
+def test_known_bucket_makes_no_client_calls(make_manager):
+    manager = make_manager()
+
+    async def spawn_twice():
+        assert await manager.ensure_bucket("known-user")
+        calls_after_first = manager.client.total_calls()
+        assert await manager.ensure_bucket("known-user")
+        return calls_after_first
+
+    calls_after_first = asyncio.run(spawn_twice())
+    assert manager.client.total_calls() == calls_after_first
+    assert manager.client.client.bucket_exists("known-user")
+
+def test_transient_errors_are_retried_with_backoff(make_manager):
+    manager = make_manager()
+    manager.client.failures["bucket_exists"] = [ProtocolError("connection reset"), s3_error("SlowDown")]
+
+    assert asyncio.run(manager.ensure_bucket("retried-user"))
+    assert manager.client.calls["bucket_exists"] == 3
+    assert manager.client.client.bucket_exists("retried-user")
+
+def test_permanent_errors_are_not_retried(make_manager):
+    manager = make_manager()
+    manager.client.failures["bucket_exists"] = [s3_error("AccessDenied")]
+
+    async def ensure():
+        # Skip the preload, so that only the bucket calls are counted
+        manager._known_buckets_task = asyncio.get_running_loop().create_future()
+        manager._known_buckets_task.set_result(None)
+        return await manager.ensure_bucket("denied-user")
+
+    assert not asyncio.run(ensure())
+    assert manager.client.calls == {"bucket_exists": 1}
+
+def test_concurrent_creation_counts_as_success(make_manager):
+    # Outside us-east-1, creating a bucket you already own fails with BucketAlreadyOwnedByYou
+    manager = make_manager(region="eu-west-1")
+    manager.client.client.make_bucket("raced-user")
+    with pytest.raises(S3Error) as error:
+        manager.client.client.make_bucket("raced-user")
+    assert error.value.code == "BucketAlreadyOwnedByYou"
+
+    # Another spawn creates the bucket between this one's existence check and its creation
+    original_client = manager.client.client
+    manager.client.client = type("RacingClient", (), {
+        "bucket_exists": lambda self, name: False,
+        "make_bucket": lambda self, name: original_client.make_bucket(name),
+        "list_buckets": lambda self: [],
+    })()
+
+    assert asyncio.run(manager.ensure_bucket("raced-user"))
+    assert manager.client.calls == {"list_buckets": 1, "bucket_exists": 1, "make_bucket": 1}
+    assert "raced-user" in manager.known_buckets
+
+def test_fallback_oid_is_a_valid_bucket_name():
+    assert MinIOManager.generate_fallback_oid("Jane.Doe@Example") == "nouid-janedoeexample"
@@ -0,0 +1,129 @@
+"""
+OccupancySeries ring arithmetic, OccupancyRecorder aggregation and snapshots, against a fake clock.
+"""
+import logging
+
+import pytest
+
+from mlhubspawner import occupancy_recorder
+from mlhubspawner.occupancy_recorder import OccupancyRecorder, OccupancySeries
+
+class FakeClock:
+    def __init__(self):
+        # A multiple of the 60 second resolution used below, so that slot boundaries are easy to follow
+        self.now = 60 * 1000
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(occupancy_recorder.time, "time", clock.time)
+    return clock
+
+def make_recorder(path="", capacity=10):
+    return OccupancyRecorder(logging.getLogger("test_occupancy_recorder"), resolution=60, capacity=capacity, snapshot_path=str(path))
+
+def test_slots_keep_the_peak_and_carry_the_current_value():
+    series = OccupancySeries(4)
+    series.set(10, (3, 3, 0, 1))
+    series.set(10, (1, 1, 0, 1))
+    assert series.read(10) == (3, 3, 0, 1)
+
+    series.advance(12)
+    assert series.read(11) == (1, 1, 0, 1)
+    assert series.read(12) == (1, 1, 0, 1)
+    # Moving backwards changes nothing
+    series.advance(11)
+    assert series.last_slot == 12
+
+def test_read_outside_the_recorded_range():
+    series = OccupancySeries(4)
+    assert series.read(0) is None
+    series.set(10, (1, 0, 1, 1))
+    assert series.read(9) is None
+    assert series.read(11) is None
+
+def test_advance_wraps_around_and_overwrites_old_slots():
+    series = OccupancySeries(4)
+    series.set(10, (5, 5, 0, 1))
+    series.set(11, (2, 2, 0, 1))
+    series.advance(14)
+
+    # Slot 14 took the place of slot 10 in the ring
+    assert series.read(10) is None
+    assert [series.read(slot) for slot in range(11, 15)] == [(5, 5, 0, 1), (2, 2, 0, 1), (2, 2, 0, 1), (2, 2, 0, 1)]
+
+def test_advance_over_a_gap_longer_than_the_ring():
+    series = OccupancySeries(4)
+    series.set(10, (7, 0, 7, 1))
+    series.set(10, (1, 0, 1, 1))
+    series.advance(1000)
+
+    assert series.read(996) is None
+    assert all(series.read(slot) == (1, 0, 1, 1) for slot in range(997, 1001))
+    assert series.slots.tolist() == [1, 0, 1, 1] * 4
+
+def test_utilization_buckets(clock):
+    recorder = make_recorder()
+    recorder.record_change("h1:22", "gpu", True, 1)
+    recorder.record_change("h1:22", "gpu", False, 1)
+    clock.now += 60
+    recorder.record_change("h1:22", "gpu", False, -1)
+    clock.now += 60
+    recorder.record_change("h2:22", "gpu", True, 1)
+    clock.now += 60
+
+    # 6 slots in buckets of 2; the first 2 slots predate the history
+    report = recorder.utilization(window=360, step=120)
+    assert report["step"] == 120
+    assert report["start"] == clock.now - 300
+    host = report["hosts"]["h1:22"]
+    assert host["total"] == [None, 2, 1]
+    assert host["exclusive"] == [None, 1, 0]
+    assert host["mean"] == [None, 2.0, 1.0]
+    machine_type = report["types"]["gpu"]
+    assert machine_type["busy"] == [None, 1, 2]
+    assert machine_type["total"] == [None, 2, 2]
+
+def test_utilization_window_is_capped_to_the_ring(clock):
+    recorder = make_recorder(capacity=10)
+    recorder.record_change("h1:22", "gpu", True, 1)
+    report = recorder.utilization(window=3600, step=60)
+    assert len(report["hosts"]["h1:22"]["total"]) == 10
+
+def test_snapshot_round_trip(clock, tmp_path):
+    path = tmp_path / "occupancy.bin"
+    recorder = make_recorder(path)
+    recorder.record_change("h1:22", "gpu", False, 1)
+    clock.now += 60
+    recorder.record_change("h1:22", "gpu", False, -1)
+    recorder.save_snapshot()
+
+    clock.now += 60
+    restored = make_recorder(path)
+    assert set(restored.hosts) == {"h1:22"} and set(restored.types) == {"gpu"}
+    for original, copy in ((recorder.hosts["h1:22"], restored.hosts["h1:22"]), (recorder.types["gpu"], restored.types["gpu"])):
+        assert copy.first_slot == original.first_slot
+        assert [copy.read(slot) for slot in range(original.first_slot, original.last_slot + 1)] == [original.read(slot) for slot in range(original.first_slot, original.last_slot + 1)]
+        # Restored series are moved to the current slot
+        assert copy.last_slot == clock.now // 60
+        assert copy.current == [0, 0, 0, 0]
+
+def test_snapshot_with_another_capacity_is_ignored(clock, tmp_path):
+    path = tmp_path / "occupancy.bin"
+    recorder = make_recorder(path, capacity=10)
+    recorder.record_change("h1:22", "gpu", True, 1)
+    recorder.save_snapshot()
+
+    assert make_recorder(path, capacity=20).hosts == {}
+
+def test_truncated_snapshot_is_ignored(clock, tmp_path):
+    path = tmp_path / "occupancy.bin"
+    recorder = make_recorder(path)
+    recorder.record_change("h1:22", "gpu", True, 1)
+    recorder.save_snapshot()
+    path.write_bytes(path.read_bytes()[:-1])
+
+    assert make_recorder(path).hosts == {}
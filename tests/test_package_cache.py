@@ -0,0 +1,19 @@
+"""
+PackageCachePrewarmer reporting, without reaching any host.
+"""
+import asyncio
+import logging
+
+import pytest
+
+pytest.importorskip("asyncssh")
+
+from mlhubspawner.package_cache import PackageCachePrewarmer
+
+def test_malformed_hostnames_only_fail_their_own_entry():
+    prewarmer = PackageCachePrewarmer(logging.getLogger("test_package_cache"), "/opt/mlhub/cache", ["numpy"], "mlhub")
+    report = asyncio.run(prewarmer.prewarm(["no-port", "too:many:colons", "10.0.0.1:not-a-port"]))
+
+    assert set(report["hosts"]) == {"no-port", "too:many:colons", "10.0.0.1:not-a-port"}
+    assert all(result["status"] == "failed" for result in report["hosts"].values())
+    assert prewarmer.last_report is report
@@ -0,0 +1,123 @@
+"""
+PollScheduler, against a fake clock.
+"""
+import logging
+
+import pytest
+
+from mlhubspawner import poll_scheduler, token_bucket
+from mlhubspawner.poll_scheduler import PollScheduler
+
+HOSTNAME = "10.0.0.1:22"
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(poll_scheduler.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(token_bucket.time, "monotonic", clock.monotonic)
+    return clock
+
+def make_scheduler(jitter=0.0, host_rate_limit=0):
+    return PollScheduler(logging.getLogger("test_poll_scheduler"), min_interval=30, max_interval=300, stable_after=3600, jitter=jitter, max_staleness=600, host_rate_limit=host_rate_limit)
+
+def check(scheduler, clock, alive=True, unique_identifier="alice"):
+    """
+    Advance to the session's next scheduled check, and record its result.
+    """
+    clock.now = scheduler.sessions[unique_identifier]['next_check']
+    assert scheduler.should_check(unique_identifier, HOSTNAME)
+    return scheduler.record_result(unique_identifier, HOSTNAME, alive)
+
+def test_interval_grows_from_min_to_max(clock):
+    scheduler = make_scheduler()
+    scheduler.register("alice", HOSTNAME)
+    assert scheduler.sessions["alice"]['next_check'] == clock.now + 30
+
+    clock.now += 29
+    assert not scheduler.should_check("alice", HOSTNAME)
+
+    # Halfway to stable_after, the interval is halfway between min_interval and max_interval
+    stable_since = scheduler.sessions["alice"]['stable_since']
+    clock.now = stable_since + 1800
+    scheduler.record_result("alice", HOSTNAME, True)
+    assert scheduler.sessions["alice"]['next_check'] == clock.now + 165
+
+    clock.now = stable_since + 7200
+    scheduler.record_result("alice", HOSTNAME, True)
+    assert scheduler.sessions["alice"]['next_check'] == clock.now + 300
+
+def test_jitter_only_brings_checks_forward(clock, monkeypatch):
+    scheduler = make_scheduler(jitter=0.3)
+    # The extremes of random.uniform(0, jitter)
+    for draw, expected in ((lambda low, high: low, 30), (lambda low, high: high, 21)):
+        monkeypatch.setattr(poll_scheduler.random, "uniform", draw)
+        scheduler.register("alice", HOSTNAME)
+        assert scheduler.sessions["alice"]['next_check'] == pytest.approx(clock.now + expected)
+
+    monkeypatch.undo()
+    for _ in range(200):
+        interval = scheduler._next_interval(0)
+        assert 21 <= interval <= 30
+
+def test_flaky_session_stays_alive_until_stale(clock):
+    scheduler = make_scheduler()
+    scheduler.register("alice", HOSTNAME)
+    clock.now += 3000
+    scheduler.record_result("alice", HOSTNAME, True)
+    last_success = clock.now
+
+    # A failed check falls back to the cached result, and the session goes back to min_interval
+    assert check(scheduler, clock, None)
+    assert scheduler.sessions["alice"]['next_check'] == clock.now + 30
+    assert scheduler.sessions["alice"]['last_checked'] == last_success
+
+    while clock.now + 30 - last_success < 600:
+        assert check(scheduler, clock, None)
+    assert not check(scheduler, clock, None)
+
+def test_stale_sessions_are_checked_despite_the_rate_limit(clock):
+    scheduler = make_scheduler(host_rate_limit=0.001)
+    scheduler.register("alice", HOSTNAME)
+    scheduler.register("bob", HOSTNAME)
+
+    clock.now += 30
+    assert scheduler.should_check("alice", HOSTNAME)
+    assert not scheduler.should_check("bob", HOSTNAME)
+
+    clock.now += 600
+    assert scheduler.should_check("bob", HOSTNAME)
+
+def test_zero_rate_limit_disables_the_cap(clock):
+    scheduler = make_scheduler(host_rate_limit=0)
+    for index in range(10):
+        scheduler.register(f"user-{index}", HOSTNAME)
+    for _ in range(3):
+        clock.now += 30
+        for index in range(10):
+            assert scheduler.should_check(f"user-{index}", HOSTNAME)
+    assert scheduler.host_buckets == {}
+
+def test_dead_sessions_are_forgotten(clock):
+    scheduler = make_scheduler()
+    scheduler.register("alice", HOSTNAME)
+
+    assert not check(scheduler, clock, False)
+    assert "alice" not in scheduler.sessions
+    # Unknown sessions are always checked, and a failed check says nothing about them
+    assert scheduler.should_check("alice", HOSTNAME)
+    assert not scheduler.record_result("alice", HOSTNAME, None)
+    assert scheduler.record_result("alice", HOSTNAME, True)
+    assert "alice" in scheduler.sessions
+
+def test_sessions_moved_to_another_host_are_checked(clock):
+    scheduler = make_scheduler()
+    scheduler.register("alice", HOSTNAME)
+    assert not scheduler.should_check("alice", HOSTNAME)
+    assert scheduler.should_check("alice", "10.0.0.2:22")